@@ -0,0 +1,110 @@
+"""SType.check_ndarray with compiled shape matchers versus the former element loop.
+
+Additionally, a batch of arrays is checked by a loop and by SType.check_many,
+and a large nested list is checked without converting it to a numpy array.
+
+Run from the repository root:
+
+    python benchmarks/bench_check_ndarray.py
+
+"""
+
+import timeit
+from types import EllipsisType
+
+import numpy as np
+from npstyping.npstyping import SType
+
+NUMBER = 200_000
+REPEAT = 5
+
+
+def check_ndarray_loop(stype: SType, array: np.ndarray) -> bool:
+    """Former implementation of SType.check_ndarray (element loop per call).
+
+    Extended by ranges and enumerations to compare them, too.
+
+    """
+    a_shape = array.shape
+    try:
+        if isinstance(stype[0], EllipsisType):
+            stype = stype[1:]
+            a_shape = a_shape[(len(a_shape) - len(stype)) :]
+        elif isinstance(stype[-1], EllipsisType):
+            stype = stype[:-1]
+            a_shape = a_shape[: len(stype)]
+        if len(a_shape) != len(stype):
+            return False
+        for s, a_s in zip(stype, a_shape, strict=False):
+            if s == ":":
+                continue
+            if s == a_s:
+                continue
+            if isinstance(s, range | frozenset) and a_s in s:
+                continue
+            return False
+    except Exception:  # noqa: BLE001
+        return False
+    return True
+
+
+def _best(stmt: str, namespace: dict) -> float:
+    """Return the best time per call in nanoseconds."""
+    times = timeit.repeat(stmt, globals=namespace, number=NUMBER, repeat=REPEAT)
+    return min(times) / NUMBER * 1e9
+
+
+def main() -> None:
+    """Print a table comparing both paths for several specifications."""
+    cases = [
+        ("(3)", (3,)),
+        ("(:, 3)", (100, 3)),
+        ("(2, :, 3, 4)", (2, 9, 3, 4)),
+        ("(2, 5, 3, 4)", (2, 5, 3, 4)),
+        ("(:, :, :, :)", (2, 5, 3, 4)),
+        ("(..., 3, 4)", (7, 2, 3, 4)),
+        ("(2, :, ...)", (2, 9, 3, 4)),
+        ("(2, :, 3, 4)", (2, 9, 3, 5)),
+        # ranges and enumerations next to the exact-size path above
+        ("(1..64, 3)", (17, 3)),
+        ("({8, 16, 32}, 3)", (16, 3)),
+        ("(2, 1..64, 3, {4, 8})", (2, 9, 3, 4)),
+    ]
+    print(f"{'stype':<24}{'shape':<16}{'loop':>10}{'compiled':>10}{'tuple ==':>10}{'speedup':>9}")
+    print(f"{'':<24}{'':<16}{'[ns]':>10}{'[ns]':>10}{'[ns]':>10}{'':>9}")
+    for spec, shape in cases:
+        namespace = {
+            "stype": SType(spec),
+            "a": np.empty(shape),
+            "shape": shape,
+            "check_ndarray_loop": check_ndarray_loop,
+        }
+        t_loop = _best("check_ndarray_loop(stype, a)", namespace)
+        t_compiled = _best("stype.check_ndarray(a)", namespace)
+        t_tuple = _best("a.shape == shape", namespace)
+        print(
+            f"{spec:<24}{shape!s:<16}{t_loop:>10.0f}{t_compiled:>10.0f}"
+            f"{t_tuple:>10.0f}{t_loop / t_compiled:>9.2f}",
+        )
+
+    # batch of small arrays: Python loop over check_ndarray versus check_many
+    rng = np.random.default_rng(0)
+    arrays = [np.empty((int(n), 3)) for n in rng.integers(1, 8, size=10_000)]
+    namespace = {"stype": SType("(:, 3)"), "arrays": arrays}
+    number = 20
+    t_loop = min(timeit.repeat("[stype.check_ndarray(a) for a in arrays]", globals=namespace, number=number, repeat=REPEAT)) / number * 1e3
+    t_many = min(timeit.repeat("stype.check_many(arrays)", globals=namespace, number=number, repeat=REPEAT)) / number * 1e3
+    print()
+    print(f"{len(arrays)} arrays: check_ndarray loop {t_loop:.2f} ms, check_many {t_many:.2f} ms, speedup {t_loop / t_many:.2f}")
+
+    # nested lists: conversion by numpy versus the copy-free shape probe
+    rows = [[0.0, 1.0, 2.0]] * 100_000
+    namespace = {"np": np, "rows": rows, "valid": SType("(:, 3)"), "invalid": SType("(:, 4)")}
+    number = 5
+    for stmt in ("np.array(rows).shape", "valid.check_ndarray(rows)", "invalid.check_ndarray(rows)"):
+        t = min(timeit.repeat(stmt, globals=namespace, number=number, repeat=REPEAT)) / number * 1e3
+        print(f"{len(rows)}x3 nested list: {stmt:<30}{t:>10.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
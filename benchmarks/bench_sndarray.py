@@ -0,0 +1,59 @@
+"""Overhead of sndarray compared to plain numpy.ndarray.
+
+Run from the repository root:
+
+    python benchmarks/bench_sndarray.py
+
+"""
+
+import timeit
+
+import numpy as np
+from npstyping.npstyping import sndarray
+
+NUMBER = 100_000
+REPEAT = 5
+
+
+def _best(stmt: str, namespace: dict) -> float:
+    """Return the best time per call in microseconds."""
+    times = timeit.repeat(stmt, globals=namespace, number=NUMBER, repeat=REPEAT)
+    return min(times) / NUMBER * 1e6
+
+
+def main() -> None:
+    """Print a table of operations on ndarray and sndarray."""
+    plain = np.ones((16, 3))
+    # all statements keep the shape valid against (..., 3)
+    checked = sndarray(plain, stype=(..., 3))
+    auto_checked = sndarray(plain, stype=(..., 3), auto_shape_check=True)
+
+    statements = [
+        "a.copy",
+        "a.shape",
+        "a.copy()",
+        "a.sum()",
+        "a.sum(axis=0)",
+        "a.reshape(8, 2, 3)",
+        "a.reshape(4, 4, 3).transpose(1, 0, 2)",
+        "a[1:]",
+        "a[0]",
+        "a + 1",
+        "np.sqrt(a)",
+        "np.concatenate([a, a])",
+    ]
+
+    print(f"{'statement':<40}{'ndarray':>10}{'sndarray':>10}{'ratio':>8}{'auto':>10}{'ratio':>8}")
+    print(f"{'':<40}{'[µs]':>10}{'[µs]':>10}{'':>8}{'[µs]':>10}{'':>8}")
+    for stmt in statements:
+        t_plain = _best(stmt, {"np": np, "a": plain})
+        t_checked = _best(stmt, {"np": np, "a": checked})
+        t_auto = _best(stmt, {"np": np, "a": auto_checked})
+        print(
+            f"{stmt:<40}{t_plain:>10.3f}{t_checked:>10.3f}{t_checked / t_plain:>8.2f}"
+            f"{t_auto:>10.3f}{t_auto / t_plain:>8.2f}",
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,186 @@
+"""Benchmark suite of the hot paths of SType, STypeLike and sndarray.
+
+Every benchmark is timed with timeit (best of several repeats) and reported
+in nanoseconds per call. The results can be written as JSON and compared with
+a former JSON result (baseline) of the same machine; the exit code is 1 if a
+benchmark is slower than the baseline by more than the threshold.
+
+Run from the repository root:
+
+    python benchmarks/suite.py                              # table
+    python benchmarks/suite.py --json results.json          # save results
+    python benchmarks/suite.py --baseline results.json      # compare, gate
+    python benchmarks/suite.py --filter sndarray --quick    # subset, fast
+
+"""
+
+import argparse
+import json
+import pickle
+import platform
+import re
+import sys
+import timeit
+from typing import NamedTuple
+
+import numpy as np
+from npstyping.npstyping import SType, STypeLike, sndarray
+
+REPEAT = 5
+QUICK_REPEAT = 2
+MIN_TIME = 0.2
+"""Minimum duration of one repeat in seconds (see timeit.Timer.autorange)."""
+QUICK_MIN_TIME = 0.02
+THRESHOLD = 0.25
+"""Default allowed slowdown relative to the baseline (0.25 == 25 %)."""
+
+
+class Benchmark(NamedTuple):
+    """A statement to time and the names it uses."""
+
+    name: str
+    stmt: str
+    namespace: dict
+
+
+def _benchmarks() -> list[Benchmark]:
+    """Return all benchmarks of the suite."""
+    plain = np.ones((16, 3))
+    arrays = {
+        "ndarray": plain,
+        "sndarray": sndarray(plain, stype=(..., 3)),
+        "sndarray_auto": sndarray(plain, stype=(..., 3), auto_shape_check=True),
+    }
+    benchmarks = [
+        # SType construction: cached values and the parser behind the cache
+        Benchmark("stype/str", "SType('(:, 3)')", {}),
+        Benchmark("stype/list", "SType(spec)", {"spec": [":", 3]}),
+        Benchmark("stype/tuple", "SType(spec)", {"spec": (":", 3)}),
+        Benchmark("stype/stype", "SType(spec)", {"spec": SType((":", 3))}),
+        Benchmark("stype/parse_str", "SType._from_elements(SType._to_stype('(:, 3, 1..4)'))", {}),
+        Benchmark("stype/parse_tuple", "SType._from_elements(SType._to_stype(spec))", {"spec": (..., 2, ":", 3)}),
+        # isinstance(..., STypeLike)
+        Benchmark("stypelike/valid", "isinstance('(:, 3)', STypeLike)", {}),
+        Benchmark("stypelike/invalid", "isinstance('(3, ..., 3)', STypeLike)", {}),
+    ]
+    # check_ndarray across ndims, with ellipsis and with ranges
+    for spec, shape in [
+        ("(3)", (3,)),
+        ("(:, 3)", (100, 3)),
+        ("(2, :, 3)", (2, 9, 3)),
+        ("(2, :, 3, 4)", (2, 9, 3, 4)),
+        ("(..., 3, 4)", (7, 2, 3, 4)),
+        ("(2, :, ...)", (2, 9, 3, 4)),
+        ("(1..64, 3)", (17, 3)),
+        ("(N, N)", (5, 5)),
+    ]:
+        namespace = {"stype": SType(spec), "a": np.empty(shape)}
+        benchmarks.append(Benchmark(f"check_ndarray/{spec}", "stype.check_ndarray(a)", namespace))
+    benchmarks.append(
+        Benchmark("check_ndarray/list", "stype.check_ndarray(a)", {"stype": SType("(:, 3)"), "a": [[1, 2, 3]] * 10}),
+    )
+    # sndarray versus ndarray; all statements keep the shape valid against (..., 3)
+    benchmarks += [
+        Benchmark("ndarray/create", "np.asarray(plain)", {"plain": plain}),
+        Benchmark("sndarray/create", "sndarray(plain, stype=(..., 3))", {"plain": plain}),
+        Benchmark("sndarray_auto/create", "sndarray(plain, stype=(..., 3), auto_shape_check=True)", {"plain": plain}),
+    ]
+    for kind, a in arrays.items():
+        for op, stmt in [
+            ("slice", "a[1:]"),
+            ("ufunc", "a + 1"),
+            ("reduce", "a.sum(axis=0)"),
+            ("reshape", "a.reshape(8, 2, 3)"),
+            ("transpose", "a.reshape(4, 4, 3).transpose(1, 0, 2)"),
+            ("function", "np.concatenate([a, a])"),
+            ("pickle", "pickle.loads(pickle.dumps(a, protocol=5, buffer_callback=(b := []).append), buffers=b)"),
+        ]:
+            benchmarks.append(Benchmark(f"{kind}/{op}", stmt, {"a": a, "pickle": pickle}))
+    return benchmarks
+
+
+def _time(benchmark: Benchmark, repeat: int, min_time: float) -> float:
+    """Return the best time per call of a benchmark in nanoseconds."""
+    namespace = {"np": np, "SType": SType, "STypeLike": STypeLike, "sndarray": sndarray, **benchmark.namespace}
+    timer = timeit.Timer(benchmark.stmt, globals=namespace)
+    # autorange() chooses 'number' for at least 0.2 s per repeat
+    number, _ = timer.autorange()
+    number = max(1, int(number * min_time / 0.2))
+    return min(timer.repeat(repeat=repeat, number=number)) / number * 1e9
+
+
+def run(pattern: str = "", *, quick: bool = False) -> dict[str, float]:
+    """Run the benchmarks whose names match the regular expression 'pattern'.
+
+    Returns
+    -------
+    dict[str, float]
+        Nanoseconds per call by benchmark name
+
+    """
+    repeat, min_time = (QUICK_REPEAT, QUICK_MIN_TIME) if quick else (REPEAT, MIN_TIME)
+    selected = [b for b in _benchmarks() if re.search(pattern, b.name)]
+    return {b.name: _time(b, repeat, min_time) for b in selected}
+
+
+def compare(results: dict[str, float], baseline: dict[str, float], threshold: float) -> list[str]:
+    """Return the names of the benchmarks which are slower than the baseline by more than 'threshold'."""
+    return [
+        name
+        for name, ns in results.items()
+        if name in baseline and ns > baseline[name] * (1.0 + threshold)
+    ]
+
+
+def main(argv: list[str] | None = None) -> int:
+    """Run the suite from the command line; returns the exit code."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--filter", default="", help="regular expression of benchmark names to run")
+    parser.add_argument("--quick", action="store_true", help="less repeats and shorter timing, for smoke tests")
+    parser.add_argument("--json", metavar="PATH", help="write the results as JSON ('-' for stdout)")
+    parser.add_argument("--baseline", metavar="PATH", help="JSON results to compare with")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=THRESHOLD,
+        help=f"allowed slowdown against the baseline, by default {THRESHOLD}",
+    )
+    args = parser.parse_args(argv)
+
+    results = run(args.filter, quick=args.quick)
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as file:  # noqa: PTH123
+            baseline = json.load(file)["results"]
+    regressions = compare(results, baseline, args.threshold)
+
+    if args.json:
+        document = {
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "machine": platform.machine(),
+            "results": results,
+            "regressions": regressions,
+        }
+        if args.json == "-":
+            json.dump(document, sys.stdout, indent=2)
+            print()
+            return int(bool(regressions))
+        with open(args.json, "w", encoding="utf-8") as file:  # noqa: PTH123
+            json.dump(document, file, indent=2)
+
+    print(f"{'benchmark':<32}{'[ns]':>10}{'baseline':>10}{'ratio':>8}")
+    for name, ns in results.items():
+        line = f"{name:<32}{ns:>10.0f}"
+        if name in baseline:
+            line += f"{baseline[name]:>10.0f}{ns / baseline[name]:>8.2f}"
+            if name in regressions:
+                line += "  REGRESSION"
+        print(line)
+    if regressions:
+        print(f"\n{len(regressions)} benchmark(s) slower than the baseline by more than {args.threshold:.0%}.")
+    return int(bool(regressions))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,12 +1,45 @@
 """npstyping – Numpy shape typing."""  # noqa: RUF002
 
+import ast
+import contextlib
+import contextvars
+import ctypes
+import datetime as dt
+import functools
+import inspect
+import math
+import operator
+import os
+import pickle
+import random
 import re
+import struct
+import sys
+import time
+import weakref
+from collections.abc import AsyncIterable, AsyncIterator, Callable, Iterable, Iterator
+from fractions import Fraction
+from multiprocessing import resource_tracker, shared_memory
 from types import EllipsisType
-from typing import Any, Literal
+from typing import (
+    TYPE_CHECKING,
+    Annotated,
+    Any,
+    Literal,
+    NamedTuple,
+    SupportsIndex,
+    get_origin,
+    get_type_hints,
+    overload,
+)
 
 import numpy as np
 from numpy.typing import ArrayLike
 
+if TYPE_CHECKING:
+    # typing.Self needs Python 3.11
+    from typing_extensions import Self
+
 # ############################################################
 #
 # Common / simple type definitions, Constants
@@ -148,86 +181,155 @@ class Colon(metaclass=_Colon_Meta):
 #   - it is SType or STypeLike object
 #   - can be converted to SType
 #
-# To be fast in checking, we check in following order:
-#   - isinstance(..., SType)
-#   - is formatted as SType (tuple of...)
-#   - is convertible into SType (Any...)
+# Parser
+# ------
+#
+# STypeLike values are parsed by one grammar only, which is used by SType and
+# therefore also by isinstance(..., STypeLike) (see _STypeLike_Meta). Since
+# SType caches its instances, a validation by isinstance() followed by SType()
+# parses the value only once.
+#
+# Grammar of strings (whitespace is allowed between all tokens):
+#
+#   string  := "[" items "]" | "(" items ")" | "{" items "}" | items
+#   items   := [item] ("," [item])*        – at least one item
+#   item    := "..." | ":" | digits | range | enum | name
+#   range   := digits ".." [digits] | ".." digits   – bounds are inclusive
+#   enum    := "{" digits ("," digits)* "}"
+#   name    := Python identifier, e.g. "N" or "batch"
+#
+# Note: Outer brackets are removed first, so "{3, 4}" is the shape (3, 4),
+# but "({3, 4})" and "{3, 4}, 2" contain an enumeration.
+#
+# Elements of lists and tuples or a single value:
 #
+#   - Ellipsis
+#   - Colon or ":"
+#   - integer >= 0 (Python or NumPy integer)
+#   - floating point value, interpretable as integer >= 0
+#   - string with a Python identifier (symbolic dimension)
+#   - range with step 1 and start >= 0 (range of allowed sizes)
+#   - set or frozenset of integers >= 0 (enumeration of allowed sizes)
+#
+# Ranges are normalized to 'range' objects ("1..64" is range(1, 65), an open
+# upper bound is sys.maxsize), enumerations to 'frozenset'.
+#
+# A symbolic dimension matches any size, but all dimensions with the same
+# name must have the same size: within one SType (e.g. "(N, N)") and, by
+# SType.bind() or unify_shapes(), across several arrays.
+#
+# An Ellipsis may be the first or the last element only, and it may be
+# used once.
+
+_STYPE_ITEM = (
+    r"\.\.\.|:|\d+\.\.\d*|\.\.\d+|\d+|\{\s*\d+\s*(?:,\s*\d+\s*)*\}|[^\W\d]\w*"
+)
+_STYPE_ITEMS = rf"\s*(?:(?:{_STYPE_ITEM})\s*)?(?:,\s*(?:(?:{_STYPE_ITEM})\s*)?)*"
+_STYPE_STRING_RE = re.compile(
+    rf"\s*(?:\[({_STYPE_ITEMS})\]|\(({_STYPE_ITEMS})\)|\{{({_STYPE_ITEMS})\}}|({_STYPE_ITEMS}))\s*",
+)
+_STYPE_ITEM_RE = re.compile(_STYPE_ITEM)
+
+
+def _parse_stype_item(item: str) -> int | str | range | frozenset | EllipsisType:
+    """Return the normalized SType element of a token of a string."""
+    if item == "...":
+        return ...
+    if item.isdigit():
+        return int(item)
+    if item.startswith("{"):
+        return frozenset(int(size) for size in item[1:-1].split(","))
+    if ".." in item:
+        low, high = item.split("..")
+        return _parse_stype_sizes(
+            range(int(low or 0), int(high) + 1 if high else sys.maxsize),
+        )
+    return item
+
+
+def _parse_stype_sizes(element: range | set | frozenset) -> range | frozenset:
+    """Return the normalized range or enumeration of sizes or raise ValueError."""
+    if isinstance(element, range):
+        if element.step != 1 or element.start < 0 or len(element) == 0:
+            raise ValueError
+        return element
+    sizes = frozenset(_parse_stype_element(size) for size in element)
+    if not sizes or not all(isinstance(size, int) for size in sizes):
+        raise ValueError
+    return sizes
+
+
+def _parse_stype_element(
+    element: object,
+) -> int | str | range | frozenset | EllipsisType:
+    """Return the normalized SType element or raise ValueError."""
+    if element is Ellipsis:
+        return ...
+    if isinstance(element, range | set | frozenset):
+        return _parse_stype_sizes(element)
+    if element is Colon or (isinstance(element, str) and element == ":"):
+        return ":"
+    if isinstance(element, float | np.floating):
+        if not element.is_integer():
+            raise ValueError
+        value = int(element)
+    elif isinstance(element, str):
+        if not element.isidentifier():
+            raise ValueError
+        return element
+    else:
+        try:
+            value = operator.index(element)
+        except TypeError:
+            raise ValueError from None
+    if value < 0:
+        raise ValueError
+    return value
 
 
-def _filter_brackets_spaces_from_string(obj: str) -> str:
-    """Remove pairs of brackets in strings.
+def _parse_stype_like(shape: object) -> tuple:
+    """Parse an STypeLike value into the tuple of normalized SType elements.
 
-    Helper function only.
+    Raises a ValueError, if the value is not STypeLike.
 
     """
-    obj = re.sub(r"[\s]", "", obj)
-    m1 = re.match(r"^[\[](.*)[\]]$", obj)
-    m2 = re.match(r"^[\()](.*)[\)]$", obj)
-    m3 = re.match(r"^[\{](.*)[\}]$", obj)
-    for m in [m1, m2, m3]:
-        if m:
-            obj = m.group(1)
-            break
-    return obj
+    try:
+        if isinstance(shape, str):
+            m = _STYPE_STRING_RE.fullmatch(shape)
+            if m is None:
+                raise ValueError  # noqa: TRY301
+            items = _STYPE_ITEM_RE.findall(m.group(m.lastindex))
+            if not items:
+                raise ValueError  # noqa: TRY301
+            elements = tuple(_parse_stype_item(item) for item in items)
+        elif isinstance(shape, list | tuple):
+            elements = tuple(_parse_stype_element(element) for element in shape)
+        else:
+            elements = (_parse_stype_element(shape),)
+        ellipsis_cnt = elements.count(...)
+        if ellipsis_cnt > 1 or (
+            ellipsis_cnt == 1 and elements[0] is not ... and elements[-1] is not ...
+        ):
+            raise ValueError  # noqa: TRY301
+    except ValueError:
+        msg = "Not a valid shape."
+        raise ValueError(msg) from None
+    return elements
 
 
 class _STypeLike_Meta(type):  # noqa: N801
     """Meta class for type class 'STypeLike'."""
 
     # Do not write '@classmethod' here!
-    def __instancecheck__(cls, obj: object) -> bool:  # noqa: C901
+    def __instancecheck__(cls, obj: object) -> bool:
         """Check if object is class STypeLike or a value what is convertible to SType."""
         if not DO_TYPECHECK:
             return True
         try:
-            # If it is SType, so it is tested by importing in SType
-            # and so it is cleare that it is also STypeLike:
-            if isinstance(obj, SType):
-                return True
-
-            # is convertible into SType?
-            if isinstance(obj, str):
-                # we have a string with or without a list inside; have to convert
-                obj = _filter_brackets_spaces_from_string(obj)
-                if (
-                    len(obj) == 0 or len(re.sub("[0-9:.,]", "", obj)) > 0
-                ):  # mask signs which should not be in the string
-                    return False
-                obj = obj.split(",")
-                for element in obj:
-                    if element in ("", ":", "..."):
-                        continue
-                    # now we make it safe to have a really positiv integer and not a floating point value
-                    # or negative values
-                    if float(element) != abs(int(element)):
-                        return False
-            # we have no string, so we could have: int | str | list[str|int|EllipsisType] | tuple[str|int|EllipsisType]
-            elif not isinstance(obj, list | tuple):
-                # this should be a single value:
-                #   - unsigned integer
-                #   - floating point, interpretable as unsigned integer
-                #   - ellipsis
-                #   - Colon
-                if not isinstance(obj, EllipsisType | Colon) and (int(obj) < 0):
-                    return False
-            else:
-                # a list or tuple
-
-                # content of each element has to be
-                #   - unsigned integer,
-                #   - floating point, interpretable as unsigned integer,
-                #   - ellipsis or
-                #   - Colon
-                for element in obj:
-                    if not isinstance(element, EllipsisType | Colon) and (
-                        int(element) < 0
-                    ):
-                        return False
-                    continue
-        except Exception:  # noqa: BLE001
+            # the parsed value is cached by SType for a following SType(obj)
+            SType(obj)
+        except ValueError:
             return False
-
         return True
 
 
@@ -283,7 +385,8 @@ class STypeLike(metaclass=_STypeLike_Meta):
 #             The "right format" is a tuple of elements of type
 #               - integer with value >= 0
 #               - EllipsisType '...'
-#               - Colon (":").
+#               - Colon (":")
+#               - str with a name of a symbolic dimension (e.g. "N").
 #             And Ellipsis may be only the first or/and the last element in
 #             tuple.
 #
@@ -297,89 +400,321 @@ class STypeLike(metaclass=_STypeLike_Meta):
 #
 #   -   check_ndarray() – check a NumPy (like) array against the shape type 'stype'
 #
+#   -   bind() – check_ndarray() with the sizes of symbolic dimensions unified
+#                 with a dict of bindings (see also unify_shapes())
+#
 #   -   _to_stype() – internal helper: converts an STypeLike object into SType
+#
+#   -   cache_info(), cache_clear(), cache_resize() – statistics and control of
+#                 the parse cache (see below)
+#
+# Parse cache
+# -----------
+#
+# SType instances are immutable, so all SType(...) calls with equal hashable
+# STypeLike values can share one instance. A bounded LRU cache maps the
+# STypeLike value to its interned SType and saves the parsing for repeated
+# specifications like "(:, 3)". Lists are used as tuple keys. Unhashable values
+# (e.g. a tuple with a list inside) are parsed without caching.
+#
+# Shape matcher
+# -------------
+#
+# Every SType instance builds once, at creation, a function (closure) which
+# checks a shape tuple (see _compile_shape_matcher()). The matcher is stored in
+# the instance attribute '_matcher'. Since instances are interned by the parse
+# cache, a specification is built once only. check_ndarray() then only reads
+# the shape and calls the matcher: there is no iteration over the elements of
+# the SType and no string comparison per call anymore, and a range or an
+# enumeration costs one comparison or one set lookup.
+#
+# check_many() applies the matcher to a whole batch of shapes by one C-level
+# loop (numpy.fromiter() over map()).
+
+
+class _ShapeLayout(NamedTuple):
+    """Precomputed layout of a SType, used by the shape matchers."""
+
+    ndim: int
+    """Number of dimensions without the Ellipsis."""
+    exact: bool
+    """False, if an Ellipsis makes 'ndim' a minimum."""
+    leading: bool
+    """True, if the Ellipsis is the first element; positions count from the end."""
+    positions: tuple[int, ...]
+    """Indices of the dimensions with a fixed size (negative, if 'leading')."""
+    sizes: tuple[int, ...]
+    """Fixed sizes of the dimensions at 'positions'."""
+    symbols: tuple[tuple[str, tuple[int, ...]], ...]
+    """Names of symbolic dimensions, each with the positions of its dimensions."""
+    ranges: tuple[tuple[int, int, int], ...]
+    """Position, lower and upper bound (inclusive) of dimensions with a size range."""
+    choices: tuple[tuple[int, frozenset[int]], ...]
+    """Position and allowed sizes of dimensions with an enumeration of sizes."""
+
+
+def _shape_layout(stype: tuple) -> _ShapeLayout:
+    """Compute the layout of normalized SType elements."""
+    leading = len(stype) > 0 and stype[0] is ...
+    trailing = not leading and len(stype) > 0 and stype[-1] is ...
+    dims = stype[1:] if leading else stype[:-1] if trailing else stype
+    ndim = len(dims)
+    positions = []
+    sizes = []
+    symbols: dict[str, list[int]] = {}
+    ranges = []
+    choices = []
+    # with a leading ellipsis we count the dimensions from the end
+    for i, s in enumerate(dims, -ndim if leading else 0):
+        if isinstance(s, int):
+            positions.append(i)
+            sizes.append(s)
+        elif isinstance(s, range):
+            ranges.append((i, s.start, s.stop - 1))
+        elif isinstance(s, frozenset):
+            choices.append((i, s))
+        elif s != ":":
+            symbols.setdefault(s, []).append(i)
+    return _ShapeLayout(
+        ndim,
+        not (leading or trailing),
+        leading,
+        tuple(positions),
+        tuple(sizes),
+        tuple((name, tuple(p)) for name, p in symbols.items()),
+        tuple(ranges),
+        tuple(choices),
+    )
+
+
+def _symbol_pairs(layout: _ShapeLayout) -> tuple[tuple[int, int], ...]:
+    """Return pairs of positions which must have the same size, because of a common name."""
+    return tuple(
+        (positions[0], p) for _, positions in layout.symbols for p in positions[1:]
+    )
+
+
+def _compile_shape_matcher(layout: _ShapeLayout) -> Callable[[tuple[int, ...]], bool]:
+    """Build a function checking a shape tuple from a SType layout.
+
+    If all dimensions have a fixed size, the shape is compared as a whole.
+    Otherwise the function is a closure over the precomputed tuples of the
+    layout: the number of dimensions (a minimum with an Ellipsis), the fixed
+    sizes (read at once by an itemgetter) and one closure for each range,
+    enumeration and pair of dimensions with a common name; groups which are
+    empty cost nothing. The dimensions given by ':' are not compared at all.
 
-class SType(tuple):
+    """
+    ndim, exact, _, positions, sizes, _, ranges, choices = layout
+    if exact and len(positions) == ndim:
+        return lambda shape: shape == sizes
+    get = operator.itemgetter(*positions) if positions else None
+    fixed = sizes if len(sizes) > 1 else sizes[0] if sizes else None
+    # one closure per range, enumeration and pair of names; chained if more
+    checks = [
+        *(lambda shape, p=p, low=low, high=high: low <= shape[p] <= high for p, low, high in ranges),
+        *(lambda shape, p=p, choice=choice: shape[p] in choice for p, choice in choices),
+        *(lambda shape, p=p, q=q: shape[p] == shape[q] for p, q in _symbol_pairs(layout)),
+    ]
+    if not checks:
+        # the usual cases, like "(:, 3)" or "(..., 3)"
+        if get is None:
+            return (lambda shape: len(shape) == ndim) if exact else (lambda shape: len(shape) >= ndim)
+        if exact:
+            return lambda shape: len(shape) == ndim and get(shape) == fixed
+        return lambda shape: len(shape) >= ndim and get(shape) == fixed
+    check = functools.reduce(_both, checks)
+    if get is None:
+        if exact:
+            return lambda shape: len(shape) == ndim and check(shape)
+        return lambda shape: len(shape) >= ndim and check(shape)
+    if exact:
+        return lambda shape: len(shape) == ndim and get(shape) == fixed and check(shape)
+    return lambda shape: len(shape) >= ndim and get(shape) == fixed and check(shape)
+
+
+def _both(
+    first: Callable[[tuple[int, ...]], bool],
+    second: Callable[[tuple[int, ...]], bool],
+) -> Callable[[tuple[int, ...]], bool]:
+    """Chain two checks of a shape matcher."""
+    return lambda shape: first(shape) and second(shape)
+
+
+def _leaf_shape(obj: object) -> tuple[int, ...] | None:
+    """Return the shape of an array object without touching its data.
+
+    numpy arrays (including memmaps and masked arrays), array API objects
+    ('__array_namespace__' or '__dlpack__' with a 'shape' attribute), objects
+    with an '__array_interface__' and objects with the buffer protocol
+    (memoryview, array.array, bytearray, ...) are supported. For other objects
+    (scalars, strings, bytes, ...) the result is None.
+
+    Unknown sizes of array API objects (None) are returned as -1; they only
+    match ':'.
+
+    """
+    if isinstance(obj, np.ndarray):
+        return obj.shape
+    if isinstance(obj, str | bytes):
+        # numpy takes them as scalars, not as buffers
+        return None
+    if hasattr(type(obj), "__array_namespace__") or hasattr(type(obj), "__dlpack__"):
+        shape = getattr(obj, "shape", None)
+        if shape is not None:
+            return tuple(-1 if size is None else operator.index(size) for size in shape)
+    interface = getattr(obj, "__array_interface__", None)
+    if isinstance(interface, dict):
+        return tuple(interface["shape"])
+    if isinstance(obj, memoryview):
+        return obj.shape
+    try:
+        with memoryview(obj) as view:
+            return view.shape
+    except TypeError:
+        return None
+
+
+def _probe_shape(array: ArrayLike) -> tuple[tuple[int, ...], int]:
+    """Return the shape of a numpy array(-like) object without copying its data.
+
+    Nested lists and tuples are probed along their first elements only. The
+    second value is the number of these nested levels; if it is not 0,
+    _is_regular() has to confirm the shape for the other elements.
+
+    """
+    if not isinstance(array, list | tuple):
+        shape = _leaf_shape(array)
+        # other array-likes are converted by numpy
+        return (np.shape(array) if shape is None else shape), 0
+    shape = []
+    obj = array
+    while isinstance(obj, list | tuple):
+        shape.append(len(obj))
+        if not obj:
+            return tuple(shape), len(shape)
+        obj = obj[0]
+    return tuple(shape) + (_leaf_shape(obj) or ()), len(shape)
+
+
+def _is_regular(obj: object, shape: tuple[int, ...], depth: int) -> bool:
+    """Check that nested lists and tuples have the shape found by _probe_shape().
+
+    The lengths of all nested sequences are compared. Scalar elements of the
+    innermost sequences are not visited, array elements must have the same shape.
+
+    """
+    if depth == 0:
+        return (_leaf_shape(obj) or ()) == shape
+    if not isinstance(obj, list | tuple) or len(obj) != shape[0]:
+        return False
+    if depth == 1 and len(shape) == 1:
+        return True
+    if depth == 2 and len(shape) == 2 and {*map(type, obj)} <= {list, tuple}:  # noqa: PLR2004
+        # innermost sequences of scalars: their lengths are compared by C loops
+        return {*map(len, obj)} <= {shape[1]}
+    return all(_is_regular(element, shape[1:], depth - 1) for element in obj)
+
+
+def _shape_of(array: ArrayLike) -> tuple[int, ...]:
+    """Return the shape of a numpy array(-like) object without copying its data.
+
+    Raises
+    ------
+    ValueError
+        if nested sequences have inhomogeneous lengths (as numpy does)
+
+    """
+    if isinstance(array, np.ndarray):
+        return array.shape
+    shape, depth = _probe_shape(array)
+    if depth and not _is_regular(array, shape, depth):
+        msg = "The nested sequences have an inhomogeneous shape."
+        raise ValueError(msg)
+    return shape
+
+
+STYPE_CACHE_MAXSIZE = 1024
+"""Default number of STypeLike values held by the SType parse cache."""
+
+
+def _new_stype(key: STypeLike) -> "SType":
+    """Parse a hashable STypeLike value into a new SType; wrapped by the parse cache."""
+    return SType._from_elements(SType._to_stype(key))  # noqa: SLF001
+
+
+# functools.lru_cache is thread-safe, does not store exceptions (invalid values
+# raise ValueError) and provides the statistics. Resizing replaces the wrapper.
+_cached_stype = functools.lru_cache(maxsize=STYPE_CACHE_MAXSIZE)(_new_stype)
+
+
+def _batch_shape(array: ArrayLike) -> tuple[int, ...] | None:
+    """Return the shape of an array-like object, None for inhomogeneous nesting."""
+    try:
+        return _shape_of(array)
+    except ValueError:
+        return None
+
+
+class SType(tuple):  # noqa: SLOT001, instances hold the compiled '_matcher'
     """Shape format descriptor."""
 
-    __slots__ = ()
+    _layout: _ShapeLayout
+    _matcher: Callable[[tuple[int, ...]], bool]
+    _derivations: dict
 
     def __new__(cls, stype_like: STypeLike) -> "SType":
         """Create a instance of SType with a value what is of type SType or convertible into it."""
-        if not isinstance(stype_like, SType):
-            stype_like = cls._to_stype(stype_like)
-        return super().__new__(cls, stype_like)
+        if isinstance(stype_like, SType):
+            # immutable, so we can use it as it is
+            return stype_like
+        key = tuple(stype_like) if isinstance(stype_like, list) else stype_like
+        try:
+            return _cached_stype(key)
+        except TypeError:
+            # unhashable, parse without caching
+            return cls._from_elements(cls._to_stype(stype_like))
+
+    @classmethod
+    def _from_elements(cls, elements: tuple) -> "SType":
+        """Create the instance from normalized elements and compile its shape matcher."""
+        obj = super().__new__(cls, elements)
+        obj._layout = _shape_layout(elements)
+        obj._matcher = _compile_shape_matcher(obj._layout)
+        obj._derivations = {}
+        return obj
+
+    def __reduce__(self) -> tuple:
+        """Pickle the elements only; the matcher is compiled again."""
+        return (SType, (tuple(self),))
+
+    @staticmethod
+    def cache_info() -> "functools._CacheInfo":
+        """Return hits, misses, maximum and current size of the SType parse cache."""
+        return _cached_stype.cache_info()
+
+    @staticmethod
+    def cache_clear() -> None:
+        """Clear the SType parse cache and its statistics."""
+        _cached_stype.cache_clear()
 
     @staticmethod
-    def _to_stype(shape: STypeLike) -> "SType":  # noqa: C901
+    def cache_resize(maxsize: int) -> None:
+        """Set the maximum number of cached STypeLike values; 0 disables the cache.
+
+        Resizing clears the cache and its statistics.
+
+        """
+        global _cached_stype  # noqa: PLW0603
+        if maxsize < 0:
+            msg = "The cache size must not be negative."
+            raise ValueError(msg)
+        _cached_stype = functools.lru_cache(maxsize=maxsize)(_new_stype)
+
+    @staticmethod
+    def _to_stype(shape: STypeLike) -> tuple:
         """Make any STypeLike object to a SType signature as a more standardised writing of the strictly typed shape."""
-        # Note: Since we change a positive non-integer into signed integer by a loop and indexing
-        #       at the end, we create a list at first and convert it to a tuple at last. (Tuple
-        #       elements can not be overwritten.)
-        try:
-            if isinstance(shape, str):
-                # we have a string with or without a list inside; have to convert
-                shape = _filter_brackets_spaces_from_string(shape)
-                if (
-                    len(shape) == 0 or len(re.sub("[0-9:.,]", "", shape)) > 0
-                ):  # mask signs which should not be in the string
-                    raise Exception  # noqa: TRY002, TRY301
-                shape = shape.split(",")
-                new_shape = []
-                for element in shape:
-                    if element == "":
-                        continue
-                    if element == ":":
-                        new_shape.append(":")
-                        continue
-                    if element == "...":
-                        new_shape.append(...)
-                        continue
-                    # now we make it safe to have a really index integer and not a floating point value
-                    # or negative values
-                    if float(element) != abs(int(element)):
-                        raise Exception  # noqa: TRY002, TRY301
-                    new_shape.append(int(element))
-                shape = new_shape
-            # we have no string, so we could have: int | str | list[str|int|EllipsisType] | tuple[str|int|EllipsisType]
-            elif not isinstance(shape, list | tuple):
-                # this should be a single value:
-                #   - unsigned integer
-                #   - floating point, interpretable as unsigned integer
-                #   - ellipsis
-
-                if isinstance(shape, EllipsisType):
-                    shape = [...]
-                elif int(shape) >= 0:
-                    shape = [int(shape)]
-                else:
-                    raise Exception  # noqa: TRY002, TRY301
-            elif isinstance(shape, tuple):
-                shape = list(shape)
-            # we should have a tuple now; but maybe with wrong content
-            ellipsis_cnt = 0
-            for i in range(len(shape)):
-                if isinstance(shape[i], EllipsisType):
-                    if (i == 0) or (i == len(shape) - 1):
-                        ellipsis_cnt += 1
-                        continue
-                    raise Exception  # noqa: TRY002, TRY301
-                if shape[i] == ":":
-                    continue
-                # now we make it safe to have a really index integer and not a floating point value
-                # or negative values
-                if isinstance(shape[i], int):
-                    if shape[i] < 0:
-                        raise Exception  # noqa: TRY002, TRY301
-                    shape[i] = int(shape[i])
-                    continue
-                raise Exception  # noqa: TRY002, TRY301
-            if ellipsis_cnt > 1:
-                raise Exception  # noqa: TRY002, TRY301
-            return tuple(shape)
-        except Exception:  # noqa: BLE001
-            msg = "Not a valid shape."
-            raise ValueError(msg)  # noqa: B904
+        return _parse_stype_like(shape)
 
     def check_ndarray(self, array: ArrayLike) -> bool:
         """Check an numpy array(-like) object for the shape.
@@ -387,48 +722,340 @@ class SType(tuple):
         The return value is a boolean. No Exception will be raised if
         the chape is not correct.
 
+        Array-like objects are not converted into numpy arrays. Nested lists
+        and tuples are walked only if the shape of their first elements
+        matches, and inhomogeneous nestings are not valid.
+
         """
         if isinstance(array, np.ndarray):
-            a_shape = array.shape
-        else:
-            a_shape = np.array(array).shape
-        stype = self  # maybe we cut out ellipsis later, so we copy it here
-        try:
-            # we remove dimensions in case an ellipsis is given at the
-            # beginning or the end
-            if isinstance(stype[0], EllipsisType):
-                # remove outer dimensions
-                stype = stype[1:]
-                a_shape = a_shape[(len(a_shape) - len(stype)) :]
-            elif isinstance(stype[-1], EllipsisType):
-                # remove inner dimensions
-                stype = stype[:-1]
-                a_shape = a_shape[: len(stype)]
-            # now the number of dimensions should be identically
-            if len(a_shape) != len(stype):
-                return False
-            # and finally, we check the shape step by step
-            for s, a_s in zip(stype, a_shape, strict=False):
-                if s == ":":
-                    # Ok. It can be any size at this dimension.
-                    continue
-                if s == a_s:
-                    # Ok. Same size of this dimension.
-                    continue
-                return False
-        except Exception:  # noqa: BLE001
-            # We do not catch all special cases individually that
-            # lead to false.
-            return False
+            return self._matcher(array.shape)
+        return self._check_array_like(array)
+
+    def _check_array_like(self, array: ArrayLike) -> bool:
+        """Check the shape of an array-like object which is not a numpy array."""
+        shape, depth = _probe_shape(array)
+        return self._matcher(shape) and (not depth or _is_regular(array, shape, depth))
+
+    def bind(self, array: ArrayLike, bindings: dict[str, int]) -> bool:
+        """Check an numpy array(-like) object for the shape and unify its symbolic dimensions.
 
-        # if we are here, so shape is ok
+        Additionally to check_ndarray(), the sizes of the symbolic dimensions
+        (e.g. 'N' in "(N, 3)") have to match the sizes already bound to these
+        names. If the check is successful, unbound names are added to
+        'bindings'. If it fails, 'bindings' keeps unchanged.
+
+        Parameters
+        ----------
+        array : ArrayLike
+            Array to check
+        bindings : dict[str, int]
+            Sizes of symbolic dimensions by name; updated in place
+
+        Returns
+        -------
+        bool
+            True, if the shape is valid and consistent with 'bindings'.
+
+        """
+        shape, depth = _probe_shape(array)
+        if not self._matcher(shape) or (depth and not _is_regular(array, shape, depth)):
+            return False
+        symbols = self._layout.symbols
+        for name, positions in symbols:
+            if bindings.get(name, shape[positions[0]]) != shape[positions[0]]:
+                return False
+        for name, positions in symbols:
+            bindings[name] = shape[positions[0]]
         return True
 
+    @overload
+    def check_many(
+        self,
+        arrays: Iterable[ArrayLike | tuple[int, ...]],
+        *,
+        return_first_failure: Literal[False] = False,
+    ) -> np.ndarray: ...
+
+    @overload
+    def check_many(
+        self,
+        arrays: Iterable[ArrayLike | tuple[int, ...]],
+        *,
+        return_first_failure: Literal[True],
+    ) -> tuple[np.ndarray, int | None]: ...
+
+    def check_many(
+        self,
+        arrays: Iterable[ArrayLike | tuple[int, ...]],
+        *,
+        return_first_failure: bool = False,
+    ) -> np.ndarray | tuple[np.ndarray, int | None]:
+        """Check a batch of numpy arrays(-like objects) or shapes for the shape.
+
+        The shapes are read first and then checked by the shape matcher in
+        one C-level loop (numpy.fromiter() over map()). The result is the same
+        as calling check_ndarray() for each array, i.e. nested sequences with
+        an inhomogeneous shape are invalid.
+
+        Parameters
+        ----------
+        arrays : Iterable[ArrayLike | tuple[int, ...]]
+            Arrays or array-like objects to check. A tuple is taken as a shape
+            itself, not as an array-like object.
+        return_first_failure : bool, optional
+            Return the index of the first failing array additionally,
+            by default False
+
+        Returns
+        -------
+        np.ndarray | tuple[np.ndarray, int | None]
+            Boolean mask, True for each array which has a valid shape. With
+            'return_first_failure' a tuple of the mask and the index of the first
+            invalid array (None, if all are valid).
+
+        """
+        arrays = arrays if isinstance(arrays, list) else list(arrays)
+        kinds = {*map(type, arrays)}
+        invalid = []
+        # batches of shapes or of arrays only (the usual case) are read by C-level loops
+        if kinds <= {tuple}:
+            shapes = arrays
+        elif all(issubclass(kind, np.ndarray) for kind in kinds):
+            shapes = list(map(operator.attrgetter("shape"), arrays))
+        else:
+            shapes = [
+                a.shape if isinstance(a, np.ndarray) else a if isinstance(a, tuple) else _batch_shape(a)
+                for a in arrays
+            ]
+            # inhomogeneous nested sequences: never valid, like in check_ndarray()
+            invalid = [i for i, shape in enumerate(shapes) if shape is None]
+            for i in invalid:
+                shapes[i] = ()
+        mask = np.fromiter(map(self._matcher, shapes), dtype=bool, count=len(shapes))
+        mask[invalid] = False
+
+        if not return_first_failure:
+            return mask
+        failures = np.flatnonzero(~mask)
+        return mask, int(failures[0]) if len(failures) else None
+
+
+def unify_shapes(
+    checks: Iterable[tuple[STypeLike, ArrayLike]],
+    bindings: dict[str, int] | None = None,
+) -> dict[str, int]:
+    """Check several arrays with shared symbolic dimensions in one pass.
+
+    Example: unify_shapes([("(N, 3)", x), ("(N,)", y)]) checks that x and y
+    have the same number of rows and returns {"N": <number of rows>}.
+
+    Parameters
+    ----------
+    checks : Iterable[tuple[STypeLike, ArrayLike]]
+        Pairs of shape type and array
+    bindings : dict[str, int] | None, optional
+        Already known sizes of symbolic dimensions; updated in place,
+        by default None
+
+    Returns
+    -------
+    dict[str, int]
+        The sizes of all symbolic dimensions by name.
+
+    Raises
+    ------
+    ShapeError
+        If an array doesn't match its shape type or the sizes of the
+        symbolic dimensions are inconsistent.
+
+    """
+    bindings = {} if bindings is None else bindings
+    for i, (stype_like, array) in enumerate(checks):
+        stype = SType(stype_like)
+        if not stype.bind(array, bindings):
+            msg = (
+                f"Array {i} with shape {np.shape(array)} does not match "
+                f"stype {stype} with bindings {bindings}."
+            )
+            raise ShapeError(msg)
+    return bindings
+
+
 #
 # Ending: SType
 #
 # ############################################################
 
+# ############################################################
+#
+# DSType (dtype and shape type)
+# =============================
+#
+# A SType with an additional restriction of the dtype. Values:
+#
+#   -   "float32[:, 3]"         – dtype name and a STypeLike string in [...]
+#   -   "floating[..., 3]"      – abstract scalar types of numpy are allowed
+#   -   "datetime64[s][:]"      – the last [...] is the shape
+#   -   (np.float32, (":", 3))  – dtype-like and STypeLike
+#   -   (None, (":", 3))        – any dtype
+#
+# The dtype of an array matches if np.issubdtype(array.dtype, dtype). The
+# result is cached per array dtype, so a check is a dict lookup and the
+# compiled shape matcher of the SType. Since DSType is a SType, it can be used
+# wherever a SType is accepted (sndarray.stype, check_shapes, unify_shapes).
+
+_DSTYPE_STRING_RE = re.compile(r"\s*([^\W\d][\w.]*(?:\[\w*\])?)\s*(\[[^\[\]]*\])\s*")
+
+
+def _parse_dtype(dtype_like: Any) -> np.dtype | type[np.generic] | None:  # noqa: ANN401
+    """Convert a dtype-like value or an abstract numpy scalar type (e.g. np.floating)."""
+    if dtype_like is None:
+        return None
+    if isinstance(dtype_like, str) and isinstance(getattr(np, dtype_like, None), type):
+        dtype_like = getattr(np, dtype_like)
+    try:
+        return np.dtype(dtype_like)
+    except TypeError:
+        if isinstance(dtype_like, type) and issubclass(dtype_like, np.generic):
+            # abstract types like np.floating have no dtype
+            return dtype_like
+        raise
+
+
+def _parse_dstype_like(dstype_like: Any) -> tuple[np.dtype | type[np.generic] | None, SType]:  # noqa: ANN401
+    """Split a DSType-like value into its dtype and its SType; raises ValueError if it is not valid."""
+    try:
+        if isinstance(dstype_like, str):
+            m = _DSTYPE_STRING_RE.fullmatch(dstype_like)
+            if m is None:
+                raise ValueError  # noqa: TRY301
+            dtype_like, stype_like = m.groups()
+        else:
+            dtype_like, stype_like = dstype_like
+        return _parse_dtype(dtype_like), SType(stype_like)
+    except (TypeError, ValueError) as error:
+        msg = "Not a valid dtype and shape."
+        raise ValueError(msg) from error
+
+
+class DSType(SType):
+    """Dtype and shape format descriptor."""
+
+    dtype: np.dtype | type[np.generic] | None
+    _dtype_matches: dict[np.dtype, bool]
+
+    def __new__(cls, dstype_like: "DSType | str | tuple") -> "DSType":
+        """Create a instance of DSType from a DSType-like value (see above)."""
+        if isinstance(dstype_like, DSType):
+            return dstype_like
+        return cls._from_stype(*_parse_dstype_like(dstype_like))
+
+    @classmethod
+    def _from_stype(cls, dtype: np.dtype | type[np.generic] | None, stype: SType) -> "DSType":
+        """Create the instance from a parsed dtype and a SType; the shape part is shared with the SType."""
+        obj = tuple.__new__(cls, stype)
+        obj._layout = stype._layout  # noqa: SLF001
+        obj._matcher = stype._matcher  # noqa: SLF001
+        obj._derivations = {}  # noqa: SLF001
+        obj.dtype = dtype
+        obj._dtype_matches = {}  # noqa: SLF001
+        return obj
+
+    def __reduce__(self) -> tuple:
+        """Pickle dtype and elements only."""
+        return (DSType, ((self.dtype, tuple(self)),))
+
+    def __repr__(self) -> str:
+        """Return dtype and elements."""
+        name = "any" if self.dtype is None else getattr(self.dtype, "name", None) or self.dtype.__name__
+        return f"DSType({name}, {tuple.__repr__(self)})"
+
+    __str__ = __repr__
+
+    def __eq__(self, other: object) -> bool:
+        """Compare dtype and shape; a DSType is never equal to a SType without dtype."""
+        if not isinstance(other, DSType):
+            return False if isinstance(other, SType) else NotImplemented
+        return self.dtype == other.dtype and tuple.__eq__(self, other)
+
+    def __ne__(self, other: object) -> bool:
+        """Negation of __eq__."""
+        equal = self.__eq__(other)
+        return equal if equal is NotImplemented else not equal
+
+    def __hash__(self) -> int:
+        """Hash of dtype and shape."""
+        return hash((self.dtype, tuple(self)))
+
+    def check_dtype(self, dtype: np.dtype) -> bool:
+        """Check a dtype by np.issubdtype(); the results are cached per dtype."""
+        matches = self._dtype_matches.get(dtype)
+        if matches is None:
+            matches = self._dtype_matches[dtype] = self.dtype is None or bool(np.issubdtype(dtype, self.dtype))
+        return matches
+
+    @staticmethod
+    def _dtype_of(array: ArrayLike) -> np.dtype:
+        """Return the dtype of a numpy array(-like) object; other objects are converted by numpy."""
+        dtype = getattr(array, "dtype", None)
+        return dtype if isinstance(dtype, np.dtype) else np.asarray(array).dtype
+
+    def check_ndarray(self, array: ArrayLike) -> bool:
+        """Check an numpy array(-like) object for the dtype and the shape.
+
+        The return value is a boolean. No Exception will be raised if
+        dtype or shape are not correct.
+
+        """
+        if isinstance(array, np.ndarray):
+            return self._matcher(array.shape) and self.check_dtype(array.dtype)
+        return self._check_array_like(array) and self.check_dtype(self._dtype_of(array))
+
+    def bind(self, array: ArrayLike, bindings: dict[str, int]) -> bool:
+        """Check dtype and shape and unify the symbolic dimensions (see SType.bind())."""
+        return self.check_dtype(self._dtype_of(array)) and super().bind(array, bindings)
+
+    def check_many(
+        self,
+        arrays: Iterable[ArrayLike | tuple[int, ...]],
+        *,
+        return_first_failure: bool = False,
+    ) -> np.ndarray | tuple[np.ndarray, int | None]:
+        """Check a batch of numpy arrays(-like objects) or shapes (see SType.check_many()).
+
+        Tuples are taken as shapes; only their shape is checked.
+
+        """
+        arrays = list(arrays)
+        mask = super().check_many(arrays)
+        mask &= [isinstance(a, tuple) or self.check_dtype(self._dtype_of(a)) for a in arrays]
+        if not return_first_failure:
+            return mask
+        failures = np.flatnonzero(~mask)
+        return mask, int(failures[0]) if failures.size else None
+
+
+def _as_stype(stype_like: "STypeLike | DSType | str | tuple") -> SType:
+    """Convert a STypeLike or DSType-like value (e.g. "float32[:, 3]") into SType or DSType."""
+    try:
+        return SType(stype_like)
+    except ValueError:
+        # report the error of SType, unless the value looks like a dtype and a shape
+        dstype_like = (
+            _DSTYPE_STRING_RE.fullmatch(stype_like) is not None
+            if isinstance(stype_like, str)
+            else isinstance(stype_like, tuple) and len(stype_like) == 2  # noqa: PLR2004
+        )
+        if not dstype_like:
+            raise
+    return DSType(stype_like)
+
+
+#
+# Ending: DSType
+#
+# ############################################################
+
 # ############################################################
 #
 # sndarray (shape typed numpy.ndarray)
@@ -445,11 +1072,123 @@ class SType(tuple):
 #
 #   -   check_stype – Method to check the restriction of the shape
 #                     against the current array shape
+#
+#   -   auto_check_policy – Attribut. A SamplingPolicy which selects the
+#                           operations checked by 'auto_shape_check'. If
+#                           it is None, AUTO_CHECK_POLICY is used (and if
+#                           that is None too, every operation is checked).
+
+
+def _call_site() -> tuple[str, int]:
+    """Return file name and line number of the first caller outside of npstyping and numpy."""
+    frame = sys._getframe(1)  # noqa: SLF001
+    while frame.f_back is not None and (
+        frame.f_globals is globals() or frame.f_globals.get("__name__", "").startswith("numpy")
+    ):
+        frame = frame.f_back
+    return frame.f_code.co_filename, frame.f_lineno
+
+
+class SamplingPolicy:
+    """Sampling of the automatic shape checks of sndarray.
+
+    The operations are counted per key: per SType or per call site (source
+    line of the operation). Of these operations, every n-th is selected, of
+    the selected ones a random fraction is checked, and at most 'budget'
+    checks are run per key.
+
+    Parameters
+    ----------
+    every : int, optional
+        Select every n-th operation, by default 1
+    rate : float, optional
+        Fraction of the selected operations to check, by default 1.0
+    budget : int | None, optional
+        Maximum number of checks per key, by default None (unlimited)
+    key : Literal["stype", "call_site"], optional
+        Count operations and checks per SType or per call site, by default "stype"
+    seed : int | None, optional
+        Seed of the random generator for 'rate', by default None
+
+    """
+
+    def __init__(
+        self,
+        every: int = 1,
+        rate: float = 1.0,
+        budget: int | None = None,
+        key: Literal["stype", "call_site"] = "stype",
+        seed: int | None = None,
+    ) -> None:
+        """Create a sampling policy."""
+        if operator.index(every) < 1:
+            msg = "'every' has to be a positive integer."
+            raise ValueError(msg)
+        if not 0.0 <= rate <= 1.0:
+            msg = "'rate' has to be between 0.0 and 1.0."
+            raise ValueError(msg)
+        if budget is not None and operator.index(budget) < 0:
+            msg = "'budget' has to be None or not negative."
+            raise ValueError(msg)
+        if key not in ("stype", "call_site"):
+            msg = "'key' has to be 'stype' or 'call_site'."
+            raise ValueError(msg)
+        self.every = every
+        self.rate = rate
+        self.budget = budget
+        self.key = key
+        self._seed = seed
+        self._random = random.Random(seed)  # noqa: S311, not used for security
+        self._operations: dict = {}
+        self._checks: dict = {}
+
+    def __repr__(self) -> str:
+        """Return the representation of the policy."""
+        return (
+            f"SamplingPolicy(every={self.every}, rate={self.rate}, budget={self.budget}, key={self.key!r})"
+        )
+
+    def __reduce__(self) -> tuple:
+        """Pickle the configuration only; counters and random generator start fresh."""
+        return (SamplingPolicy, (self.every, self.rate, self.budget, self.key, self._seed))
+
+    def sample(self, stype: SType) -> bool:
+        """Count an operation on an array with 'stype' and return if it has to be checked."""
+        key = stype if self.key == "stype" else _call_site()
+        operations = self._operations.get(key, 0)
+        self._operations[key] = operations + 1
+        if operations % self.every:
+            return False
+        if self.rate < 1.0 and self._random.random() >= self.rate:
+            return False
+        checks = self._checks.get(key, 0)
+        if self.budget is not None and checks >= self.budget:
+            return False
+        self._checks[key] = checks + 1
+        return True
+
+    def counts(self) -> dict:
+        """Return the numbers of operations and checks per key as {key: (operations, checks)}."""
+        return {key: (n, self._checks.get(key, 0)) for key, n in self._operations.items()}
+
+    def reset(self) -> None:
+        """Reset all counters (and so the budgets)."""
+        self._operations.clear()
+        self._checks.clear()
+
+
+AUTO_CHECK_POLICY: SamplingPolicy | None = None
+"""Global SamplingPolicy of all sndarrays without an own 'auto_check_policy'. None checks every operation."""
 
 
 class sndarray(np.ndarray):  # noqa: N801, Compatible naming to type numpy.ndarray
     """Numpy array with shape restiction behavior."""
 
+    # defaults for arrays created without __array_finalize__ (e.g. by numpy's unpickling)
+    _stype: SType | None = None
+    auto_shape_check: bool = False
+    auto_check_policy: SamplingPolicy | None = None
+
     # implementation see: https://numpy.org/doc/2.1/user/basics.subclassing.html
     def __new__(
         cls,
@@ -459,24 +1198,72 @@ class sndarray(np.ndarray):  # noqa: N801, Compatible naming to type numpy.ndarr
         *,
         stype: STypeLike | bool | None = None,
         auto_shape_check: bool = False,
+        auto_check_policy: SamplingPolicy | None = None,
         device: Literal["cpu"] | None = None,
         copy: bool | None = None,
         like: ArrayLike | None = None,
     ) -> "sndarray":
-        """Create sndarray class."""
+        """Create sndarray class.
+
+        With 'auto_shape_check' and a 'stype', the shape of 'a' is checked
+        before 'a' is converted. The shape of array API objects, memmaps and
+        buffers is read without touching their data. The dtype of a DSType is
+        checked after the conversion (by 'dtype').
+
+        Raises
+        ------
+        ShapeError
+            if 'auto_shape_check' is set and 'a' does not match 'stype'
+
+        """
+        checked = auto_shape_check and stype is not None and not isinstance(stype, bool)
+        if checked:
+            stype = _as_stype(stype)
+            # the shape only: the dtype is known after the conversion by 'dtype'
+            if not SType.check_ndarray(stype, a):
+                msg = f"Array with shape {_probe_shape(a)[0]} does not match stype {stype}."
+                raise ShapeError(msg)
         # Create the numpy array
         obj = np.asarray(a, dtype, order, device=device, copy=copy, like=like).view(cls)
+        if checked and isinstance(stype, DSType) and not stype.check_dtype(obj.dtype):
+            msg = f"Array with dtype {obj.dtype} does not match stype {stype}."
+            raise ShapeError(msg)
         # Add additional properties
         obj.auto_shape_check = auto_shape_check
+        obj.auto_check_policy = auto_check_policy
         obj.stype = stype
         return obj
 
     def __array_finalize__(self, obj: object) -> None:
         """Finalize the array."""
-        if obj is None:
+        if obj is None or not isinstance(obj, sndarray):
+            # the class attributes are the defaults
             return
-        self.stype = getattr(obj, "stype", None)
-        self.auto_shape_check = getattr(obj, "auto_shape_check", None)
+        # copy the constraint as it is; it was already converted into SType
+        stype = obj._stype  # noqa: SLF001
+        self.auto_shape_check = obj.auto_shape_check
+        self.auto_check_policy = obj.auto_check_policy
+        if (
+            stype is not None
+            and not self.auto_shape_check
+            and (self.shape != obj.shape or (type(stype) is not SType and self.dtype != obj.dtype))
+        ):
+            # see _result_stype(); inlined, as it runs for every view
+            stype = _kept_stype(stype, self.shape, self.dtype)
+        self._stype = stype
+
+    def __reduce_ex__(self, protocol: SupportsIndex) -> tuple:
+        """Pickle the data as plain ndarray and the constraint separately.
+
+        The data uses numpy's own pickling, so with protocol 5 contiguous
+        arrays are passed as out-of-band buffers (zero copy). The SType is
+        pickled by its elements only, the SamplingPolicy by its configuration.
+
+        """
+        return (
+            _unpickle_sndarray,
+            (self.view(np.ndarray), self._stype, self.auto_shape_check, self.auto_check_policy),
+        )
 
     @property
     def stype(self) -> SType:
@@ -494,7 +1281,24 @@ class sndarray(np.ndarray):  # noqa: N801, Compatible naming to type numpy.ndarr
                 self._stype = SType(self.shape)
             # 'False' has no meaning.
             return
-        self._stype = SType(stype_like)
+        self._stype = _as_stype(stype_like)
+
+    def _result_stype(self, shape: tuple[int, ...], dtype: np.dtype) -> SType | None:
+        """Return the stype of a result with 'shape' and 'dtype' which is not derived by a rule.
+
+        With 'auto_shape_check' the stype is a constraint and always kept.
+        Otherwise it describes the array and is kept as long as it matches
+        the result (see _kept_stype()).
+
+        """
+        stype = self._stype
+        if (
+            stype is None
+            or self.auto_shape_check
+            or (shape == self.shape and (type(stype) is SType or dtype == self.dtype))
+        ):
+            return stype
+        return _kept_stype(stype, shape, dtype)
 
     def check_stype(self, stype_like: STypeLike | None = None) -> bool:
         """Check the array by shape restrictions.
@@ -515,7 +1319,7 @@ class sndarray(np.ndarray):  # noqa: N801, Compatible naming to type numpy.ndarr
 
         """
         if stype_like is not None:
-            self._stype = SType(stype_like)
+            self._stype = _as_stype(stype_like)
         elif self._stype is None:
             msg = "'check_stype()' requested, but 'stype' property not yet set or assigned."
             raise AttributeError(msg)
@@ -525,52 +1329,1841 @@ class sndarray(np.ndarray):  # noqa: N801, Compatible naming to type numpy.ndarr
     # parts of code to implement 'auto-check' and 'keep stype' behaviour
     # ------------------------------------------------------------------
     #
+    # The stype is propagated by NumPy's subclassing protocols only:
+    #
+    #   - __array_finalize__  – views, copies, slices and every new sndarray
+    #                           created from an existing one
+    #   - __array_ufunc__     – results of ufuncs and operators, including
+    #                           reductions; in-place operations and 'out='
+    #                           return the given output arrays unchanged
+    #   - __array_wrap__      – results of other numpy code wrapping arrays
+    #   - __array_function__  – results of numpy functions (np.concatenate, ...)
+    #                           which are not already a sndarray
+    #
+    # Element-wise ufunc calls are checked before the output is allocated: the
+    # broadcast shape of the operands is matched against the stype ("pre-flight"),
+    # so e.g. a (n, 1) + (1, n) mistake raises before a (n, n) array exists.
+    #
+    # Attribute lookup is not touched at all. The few ndarray methods which can
+    # change the shape without passing one of the protocols above are
+    # overwritten explicitly (see _SHAPE_CHANGING_METHODS below the class), and
+    # so are indexing, T, view() and resize() (in place). Results which are the array
+    # itself or a given output array ('out=') are returned without a check:
+    # they keep their own stype.
+
+    def __getitem__(self, key: Any) -> Any:  # noqa: ANN401
+        """Index the array; without 'auto_shape_check' the stype of the result is derived from the key."""
+        result = super().__getitem__(key)
+        stype = self._stype
+        if stype is None or self.auto_shape_check or not isinstance(result, sndarray):
+            return result
+        if (
+            type(key) is slice
+            and result._stype is stype  # noqa: SLF001, kept by __array_finalize__: the result matches
+            and (stype[0] == ":" or (stype[0] is Ellipsis and self.ndim > stype._layout.ndim))  # noqa: SLF001
+        ):
+            # fast path: a slice of an unrestricted first axis keeps the stype
+            return result
+        operation = (self.shape, result.shape, (key,), {})
+        result._stype = _derived_stype(stype, _index_rule, operation, result.dtype, _index_signature(key))  # noqa: SLF001
+        return result
+
+    @property
+    def resize(self) -> Callable[..., None]:
+        """Change shape and size of the array in place (see numpy.ndarray.resize()).
+
+        With 'auto_shape_check' the new shape is checked before the array is
+        changed; without it, the stype is derived like for reshape().
+
+        A property of a partial, so that the reference check of numpy counts
+        the same references for a bound method as for a direct call.
+
+        Raises
+        ------
+        ShapeError
+            if 'auto_shape_check' is set and the new shape does not match the stype
+
+        """
+        return functools.partial(_resize, self)
+
+    def view(self, *args: Any, **kwargs: Any) -> Any:  # noqa: ANN401
+        """Return a new view of the array (see numpy.ndarray.view()).
+
+        A view with another dtype may have another shape, too; both are set
+        after __array_finalize__, so the stype is adapted here.
+
+        """
+        result = super().view(*args, **kwargs)
+        if (
+            isinstance(result, sndarray)
+            and result._stype is not None  # noqa: SLF001
+            and (result.dtype != self.dtype or result.shape != self.shape)
+        ):
+            result._stype = self._result_stype(result.shape, result.dtype)  # noqa: SLF001
+        return result
+
+    @property
+    def T(self) -> "sndarray":  # noqa: N802
+        """Transposed array; the same as transpose()."""
+        return self.transpose()
+
+    def _auto_check(self, result: Any, sampled: bool | None = None) -> Any:  # noqa: ANN401, FBT001
+        """Check a result of an operation on this array if 'auto_shape_check' is set.
+
+        The result is only checked if its shape (or, with a DSType, its dtype)
+        differs from this array and the sampling policy selects the operation. Raises a ShapeError
+        if the check fails, otherwise the result is returned unchanged. 'sampled' is the
+        decision of the policy, if it was already asked by the pre-flight check.
+
+        """
+        if (
+            not self.auto_shape_check
+            or self._stype is None
+            or not isinstance(result, np.ndarray)
+            or (result.shape == self.shape and (result.dtype == self.dtype or type(self._stype) is SType))
+        ):
+            return result
+        touched = _deferred_arrays.get()
+        if touched is not None and isinstance(result, sndarray):
+            # inside deferred_shape_checks(): checked at the end of the scope
+            touched[id(result)] = result
+            return result
+        if sampled is None:
+            policy = self.auto_check_policy or AUTO_CHECK_POLICY
+            sampled = policy is None or policy.sample(self._stype)
+        if sampled and not self._stype.check_ndarray(result):
+            dtype = "" if type(self._stype) is SType else f" (dtype {result.dtype})"
+            msg = f"Result shape {result.shape}{dtype} does not match stype {self._stype}."
+            raise ShapeError(msg)
+        return result
+
+    def _preflight(self, ufunc: np.ufunc, inputs: tuple) -> bool | None:
+        """Check the broadcast shape of an element-wise ufunc call (with 'auto_shape_check') before it runs.
+
+        Returns the decision of the sampling policy (None, if nothing was
+        decided) for the check of the result.
+
+        Raises
+        ------
+        ShapeError
+            if the broadcast shape does not match the stype
+
+        """
+        if self._stype is None or ufunc.signature is not None or _deferred_arrays.get() is not None:
+            return None
+        shape = _broadcast_shape(inputs)
+        if shape is None or shape == self.shape:
+            # not broadcastable: numpy raises its own error
+            return None
+        policy = self.auto_check_policy or AUTO_CHECK_POLICY
+        if policy is not None and not policy.sample(self._stype):
+            return False
+        if not self._stype._matcher(shape):  # noqa: SLF001
+            msg = f"Broadcast shape {shape} of {ufunc.__name__}() does not match stype {self._stype}."
+            raise ShapeError(msg)
+        return True
 
-    # implement the process into all of numpy operations
-    def __getattribute__(self, name: Any) -> Any:  # noqa: ANN401
-        """Overwrtes the method to add some functionality around the numpy methods."""
-        attr = super().__getattribute__(name)
+    def __array_ufunc__(
+        self,
+        ufunc: np.ufunc,
+        method: str,
+        *inputs: Any,  # noqa: ANN401
+        **kwargs: Any,  # noqa: ANN401
+    ) -> Any:  # noqa: ANN401
+        """Run a ufunc on plain ndarrays and wrap its results into sndarray.
 
-        if callable(attr):
+        Given output arrays ('out=', in-place operators) are returned as they
+        are. New results get the stype and are checked by the auto shape check;
+        element-wise calls are checked before the output is allocated.
 
-            def wrapper_method(*args, **kwargs):  # noqa: ANN202
-                """Add some functionality around the numpy methods."""
-                if self._auto_shape_check:
-                    current_shape = self.shape
+        """
+        outs = kwargs.get("out")
+        sampled = None
+        if self.auto_shape_check and method == "__call__" and outs is None:
+            sampled = self._preflight(ufunc, inputs)
+        inputs = [np.ndarray.view(x, np.ndarray) if isinstance(x, sndarray) else x for x in inputs]
+        if outs is not None:
+            kwargs["out"] = tuple(np.ndarray.view(x, np.ndarray) if isinstance(x, sndarray) else x for x in outs)
+        results = super().__array_ufunc__(ufunc, method, *inputs, **kwargs)
+        if results is NotImplemented or method == "at":
+            return results
+        if ufunc.nout == 1:
+            if outs is not None and outs[0] is not None:
+                return outs[0]
+            if not isinstance(results, np.ndarray):
+                return results
+            # inlined _wrap_result() of the usual case
+            array = results.view(sndarray)
+            array.auto_shape_check = self.auto_shape_check
+            array.auto_check_policy = self.auto_check_policy
+            if self.auto_shape_check:
+                array._stype = self._stype  # noqa: SLF001
+                return self._auto_check(array, sampled)
+            if method != "reduce" or array.shape == self.shape or self._stype is None:
+                array._stype = self._result_stype(array.shape, array.dtype)  # noqa: SLF001
+            else:
+                operation = (self.shape, array.shape, (), kwargs)
+                signature = (kwargs.get("axis", 0), kwargs.get("keepdims", False))
+                array._stype = _derived_stype(self._stype, _ufunc_reduce_rule, operation, array.dtype, signature)  # noqa: SLF001
+            return array
+        return tuple(
+            self._wrap_result(result, outs and outs[i], sampled) for i, result in enumerate(results)
+        )
+
+    def _wrap_result(self, result: Any, out: np.ndarray | None, sampled: bool | None) -> Any:  # noqa: ANN401, FBT001
+        """Return a given output array as it is and a new result as checked sndarray with the stype."""
+        if out is not None:
+            return out
+        if not isinstance(result, np.ndarray):
+            return result
+        array = result.view(sndarray)
+        array._stype = self._result_stype(array.shape, array.dtype)  # noqa: SLF001
+        array.auto_shape_check = self.auto_shape_check
+        array.auto_check_policy = self.auto_check_policy
+        return self._auto_check(array, sampled)
+
+    def __array_wrap__(
+        self,
+        array: np.ndarray,
+        context: tuple | None = None,
+        return_scalar: bool = False,  # noqa: FBT001, FBT002
+    ) -> Any:  # noqa: ANN401
+        """Wrap ufunc results into sndarray and run the auto shape check."""
+        if return_scalar:
+            # full reductions: a scalar has no shape to restrict
+            return array[()]
+        return self._auto_check(super().__array_wrap__(array, context, return_scalar))
+
+    def __array_function__(
+        self,
+        func: Any,  # noqa: ANN401
+        types: Any,  # noqa: ANN401
+        args: Any,  # noqa: ANN401
+        kwargs: Any,  # noqa: ANN401
+    ) -> Any:  # noqa: ANN401
+        """Keep the stype on results of numpy functions and run the auto shape check."""
+        result = super().__array_function__(func, types, args, kwargs)
+        if result is kwargs.get("out"):
+            # written into a given output array, which keeps its own stype
+            return result
+        if isinstance(result, np.ndarray) and not isinstance(result, sndarray):
+            result = result.view(sndarray)
+            result._stype = self._result_stype(result.shape, result.dtype)  # noqa: SLF001
+            result.auto_shape_check = self.auto_shape_check
+            result.auto_check_policy = self.auto_check_policy
+        return self._auto_check(result)
+
+
+def _kept_stype(stype: SType, shape: tuple[int, ...], dtype: np.dtype) -> SType | None:
+    """Return the stype of an array with 'shape' and 'dtype' derived without a rule.
+
+    The stype is kept if it matches the shape; a DSType keeps its dtype only
+    if it matches 'dtype', too (e.g. not after astype() or a comparison).
+    Otherwise the stype is unknown (None).
 
-                result = attr(*args, **kwargs)
+    """
+    if not stype._matcher(shape):  # noqa: SLF001
+        return None
+    if type(stype) is SType or stype.check_dtype(dtype):
+        return stype
+    return SType(tuple(stype))
 
-                if isinstance(result, np.ndarray):
-                    if hasattr(result, "device"):
-                        result = sndarray(
-                            a=result,
-                            dtype=result.dtype,
-                            stype=self._stype,
-                            auto_shape_check=self._auto_shape_check,
-                            device=self.device,
-                        )
-                    else:
-                        result = sndarray(
-                            a=result,
-                            dtype=result.dtype,
-                            stype=self._stype,
-                            auto_shape_check=self._auto_shape_check,
-                        )
 
-                if (
-                    self._auto_shape_check
-                    and hasattr(result, "shape")
-                    and current_shape != result.shape
-                ):
-                    result.stype.check_ndarray(result.__array__(copy=False))
+def _broadcast_shape(operands: tuple) -> tuple[int, ...] | None:
+    """Return the broadcast shape of ufunc operands or None, if they can't be broadcast.
 
-                return result
+    Faster than np.broadcast_shapes() for the usual operands: arrays of the
+    same shape and Python or numpy scalars.
 
-            return wrapper_method
-        return attr
+    """
+    result = ()
+    for operand in operands:
+        if isinstance(operand, np.ndarray):
+            shape = operand.shape
+        elif isinstance(operand, (int, float, complex, np.generic)):
+            continue
+        else:
+            shape = np.shape(operand)
+        if shape == result or not shape:
+            continue
+        if not result:
+            result = shape
+            continue
+        if len(shape) < len(result):
+            shape = (1,) * (len(result) - len(shape)) + shape
+        elif len(result) < len(shape):
+            result = (1,) * (len(shape) - len(result)) + result
+        sizes = []
+        for m, n in zip(result, shape, strict=True):
+            if m not in (n, 1) and n != 1:
+                return None
+            sizes.append(n if m == 1 else m)
+        result = tuple(sizes)
+    return result
+
+
+def _resize_shape(args: tuple) -> tuple[int, ...] | None:
+    """Return the new shape of the arguments of resize(); None, if there is none."""
+    if not args or args == (None,):
+        return None
+    shape = args[0] if len(args) == 1 else args
+    try:
+        return (operator.index(shape),)
+    except TypeError:
+        return tuple(operator.index(size) for size in shape)
+
+
+def _resize(array: sndarray, *new_shape: Any, refcheck: bool = True) -> None:  # noqa: ANN401
+    """Resize 'array' for sndarray.resize().
+
+    The reference check is done here like numpy does it, but without the
+    references of the partial, of this frame and of sys.getrefcount(); numpy
+    itself would count them as references of other objects.
+
+    """
+    shape = _resize_shape(new_shape)
+    if shape is None:
+        return
+    stype = array._stype  # noqa: SLF001
+    if array.auto_shape_check and stype is not None and _deferred_arrays.get() is None:
+        policy = array.auto_check_policy or AUTO_CHECK_POLICY
+        if (policy is None or policy.sample(stype)) and not stype._matcher(shape):  # noqa: SLF001
+            msg = f"New shape {shape} does not match stype {stype}."
+            raise ShapeError(msg)
+    old_shape = array.shape
+    if (
+        refcheck
+        and array.base is None
+        and math.prod(shape) != array.size
+        and (sys.getrefcount(array) > 4 or weakref.getweakrefcount(array))  # noqa: PLR2004
+    ):
+        msg = "cannot resize an array that is referenced by another object; use np.resize() or refcheck=False"
+        raise ValueError(msg)
+    # an array with a base is rejected by numpy itself: it does not own its data
+    np.ndarray.resize(array, shape, refcheck=False)
+    if stype is None or shape == old_shape:
+        return
+    if array.auto_shape_check:
+        touched = _deferred_arrays.get()
+        if touched is not None:
+            touched[id(array)] = array
+    else:
+        array._stype = _derived_stype(stype, _reshape_rule, (old_shape, shape, (), {}), array.dtype, ())  # noqa: SLF001
+
+
+def _unpickle_sndarray(
+    array: np.ndarray,
+    stype: SType | None,
+    auto_shape_check: bool,  # noqa: FBT001
+    auto_check_policy: SamplingPolicy | None,
+) -> sndarray:
+    """Rebuild a pickled sndarray (see sndarray.__reduce_ex__)."""
+    result = array.view(sndarray)
+    result._stype = stype  # noqa: SLF001
+    result.auto_shape_check = auto_shape_check
+    result.auto_check_policy = auto_check_policy
+    return result
+
+
+#
+# stype propagation rules
+# -----------------------
+#
+# Without 'auto_shape_check', the stype describes the array and follows the
+# operations which change the shape: the stype of the result is derived from
+# the stype of the array and the arguments of the operation by the rules
+# below (indexing, reductions, transpose, reshape, squeeze; np.expand_dims
+# reshapes).
+# The element of an axis is kept as long as the axis is kept (sizes, ':',
+# names, ranges and enumerations alike); an Ellipsis is expanded to ':' for
+# the actual number of dimensions first. So the result matches its stype by
+# construction and needs no check. If the array doesn't match its own stype,
+# the result gets no stype. Other operations keep the stype as long as it
+# matches the shape of the result (e.g. np.concatenate() of "(:, 3)" arrays);
+# otherwise the stype of the result is unknown (None). A DSType whose dtype
+# doesn't match the result (astype(), comparisons, views) keeps its shape part.
+#
+# The derived stypes are memoized per stype by the shapes and the arguments
+# of the operation (see _derived_stype()): repeated operations look them up
+# in a dict, and the parse cache is not filled by derived stypes.
+#
+# With 'auto_shape_check', the stype is a constraint of all arrays derived
+# from the array: it is kept and the results are checked (see above).
+
+
+class _ShapeOperation(NamedTuple):
+    """Shapes and arguments of an operation, for the stype propagation rules."""
+
+    shape: tuple[int, ...]
+    new_shape: tuple[int, ...]
+    args: tuple
+    kwargs: dict
+
+
+def _expanded_elements(stype: SType, shape: tuple[int, ...]) -> tuple | None:
+    """Return the elements of stype with the Ellipsis expanded to ':' for 'shape'; None, if it doesn't match."""
+    if not stype._matcher(shape):  # noqa: SLF001
+        return None
+    ndim, exact, leading = stype._layout[:3]  # noqa: SLF001
+    if exact:
+        return stype
+    colons = (":",) * (len(shape) - ndim)
+    return colons + stype[1:] if leading else stype[:-1] + colons
+
+
+def _normalized_axes(axis: int | tuple[int, ...] | None, ndim: int) -> tuple[int, ...]:
+    """Return the axes of an 'axis' argument as not negative integers."""
+    if axis is None:
+        return tuple(range(ndim))
+    axes = axis if isinstance(axis, tuple) else (axis,)
+    return tuple(operator.index(a) % ndim for a in axes) if ndim else ()
+
+
+def _reduced(elements: tuple, axis: int | tuple[int, ...] | None, keepdims: bool) -> tuple:  # noqa: FBT001
+    """Drop the reduced axes or, with 'keepdims', replace them by 1."""
+    axes = _normalized_axes(axis, len(elements))
+    if keepdims:
+        return tuple(1 if i in axes else element for i, element in enumerate(elements))
+    return tuple(element for i, element in enumerate(elements) if i not in axes)
+
+
+def _ufunc_reduce_rule(elements: tuple, operation: _ShapeOperation) -> tuple:
+    """ufunc.reduce(array, axis=0, ..., keepdims=False); numpy passes all arguments by name."""
+    return _reduced(elements, operation.kwargs.get("axis", 0), operation.kwargs.get("keepdims", False))
+
+
+def _arg_reduce_rule(elements: tuple, operation: _ShapeOperation) -> tuple:
+    """argmax(axis=None, out=None, *, keepdims=False) and argmin()."""
+    args, kwargs = operation.args, operation.kwargs
+    return _reduced(elements, args[0] if args else kwargs.get("axis"), kwargs.get("keepdims", False))
+
+
+def _transpose_rule(elements: tuple, operation: _ShapeOperation) -> tuple:
+    """transpose(*axes), transpose(axes) and transpose()."""
+    axes = operation.args[0] if len(operation.args) == 1 else operation.args
+    if axes is None or not axes:
+        return elements[::-1]
+    return tuple(elements[i] for i in _normalized_axes(tuple(axes), len(elements)))
+
+
+def _swapaxes_rule(elements: tuple, operation: _ShapeOperation) -> tuple:
+    """swapaxes(axis1, axis2)."""
+    i, j = _normalized_axes(operation.args, len(elements))
+    swapped = list(elements)
+    swapped[i], swapped[j] = elements[j], elements[i]
+    return tuple(swapped)
+
+
+def _reshape_rule(elements: tuple, operation: _ShapeOperation) -> tuple:
+    """reshape(), ravel() and flatten(): leading and trailing axes of unchanged size keep their elements.
+
+    The sizes of all other axes are known by the result.
+
+    """
+    shape, new_shape = operation.shape, operation.new_shape
+    n = min(len(shape), len(new_shape))
+    k = 0
+    while k < n and new_shape[k] == shape[k]:
+        k += 1
+    j = 0
+    while j < n - k and new_shape[-1 - j] == shape[-1 - j]:
+        j += 1
+    return (*elements[:k], *new_shape[k : len(new_shape) - j], *elements[len(shape) - j :])
+
+
+def _squeeze_rule(elements: tuple, operation: _ShapeOperation) -> tuple:
+    """squeeze(axis=None)."""
+    axis = operation.args[0] if operation.args else operation.kwargs.get("axis")
+    axes = (
+        tuple(i for i, size in enumerate(operation.shape) if size == 1)
+        if axis is None
+        else _normalized_axes(axis, len(elements))
+    )
+    return tuple(element for i, element in enumerate(elements) if i not in axes)
+
+
+def _narrowed(element: object, size: int) -> object:
+    """Element of an axis narrowed to 'size' (by a slice or an index array)."""
+    return ":" if element == ":" else size
+
+
+def _expanded_key(key: object, ndim: int) -> tuple | None:
+    """Return an index key as tuple with one item per axis (and None items); None, if it is not supported.
+
+    Supported are basic indexing and one 1-dimensional index array (or list).
+    Integers next to the index array are advanced indices, too: if they are
+    separated from it (by a slice, None or an Ellipsis), numpy moves the
+    indexed axis to the front, which is not supported.
+
+    """
+    key = key if isinstance(key, tuple) else (key,)
+    consumed = 0
+    ellipsis = None
+    array = None
+    integers = []
+    for i, item in enumerate(key):
+        if item is None:
+            continue
+        if item is Ellipsis:
+            ellipsis = i
+            continue
+        if isinstance(item, bool | np.bool_ | str):
+            return None
+        if not isinstance(item, slice):
+            try:
+                operator.index(item)
+                integers.append(i)
+            except TypeError:
+                if array is not None or np.ndim(item) != 1:
+                    return None
+                array = i
+        consumed += 1
+    if array is not None and integers and max(array, *integers) - min(array, *integers) != len(integers):
+        return None
+    full = (slice(None),) * (ndim - consumed)
+    if ellipsis is None:
+        return (*key, *full)
+    return (*key[:ellipsis], *full, *key[ellipsis + 1 :])
+
+
+def _index_rule(elements: tuple, operation: _ShapeOperation) -> tuple | None:
+    """Indexing by the key operation.args[0].
+
+    Integers drop an axis, slices and an index array keep it or narrow it,
+    None adds an axis of size 1 and the Ellipsis stands for all axes not
+    indexed otherwise. Other keys (several index arrays, multidimensional
+    ones, field names) give None: the stype is unknown.
+
+    """
+    key = operation.args[0]
+    shape, new_shape = operation.shape, operation.new_shape
+    # the usual keys: an integer or a slice of the first axis
+    if type(key) is int:
+        return elements[1:]
+    if type(key) is slice:
+        return elements if new_shape[0] == shape[0] else (_narrowed(elements[0], new_shape[0]), *elements[1:])
+    key = _expanded_key(key, len(shape))
+    if key is None:
+        return None
+    derived = []
+    axis = 0
+    for item in key:
+        if item is None:
+            derived.append(1)
+            continue
+        size = shape[axis]
+        if isinstance(item, slice):
+            new_size = len(range(*item.indices(size)))
+        elif isinstance(item, np.ndarray | list | tuple):
+            new_size = new_shape[len(derived)]
+        else:
+            axis += 1
+            continue
+        derived.append(elements[axis] if new_size == size else _narrowed(elements[axis], new_size))
+        axis += 1
+    return tuple(derived)
+
+
+_BASIC_INDEX_TYPES = frozenset({int, np.intp, slice, type(None), EllipsisType})
+
+
+def _index_signature(key: object) -> object:
+    """Return the signature of an index key for _derived_stype().
+
+    With basic indexing, the types of the items determine the derived
+    stype together with the shapes, so e.g. a[0] and a[1] share their
+    derivation. Other keys are their own signature.
+
+    """
+    kind = type(key)
+    if kind is int or kind is slice:
+        # the usual keys
+        return (kind,)
+    kinds = tuple(map(type, key)) if kind is tuple else (kind,)
+    return kinds if _BASIC_INDEX_TYPES.issuperset(kinds) else key
+
+
+_StypeRule = Callable[[tuple, _ShapeOperation], tuple | None]
+
+_STYPE_RULES: dict[str, _StypeRule] = {
+    "argmax": _arg_reduce_rule,
+    "argmin": _arg_reduce_rule,
+    "flatten": _reshape_rule,
+    "ravel": _reshape_rule,
+    "reshape": _reshape_rule,
+    "squeeze": _squeeze_rule,
+    "swapaxes": _swapaxes_rule,
+    "transpose": _transpose_rule,
+}
+"""Rules deriving the stype of the results of ndarray methods."""
+
+
+DERIVATIONS_MAXSIZE = 64
+"""Number of derived stypes memoized per SType (see _derived_stype())."""
+
+
+def _derived_stype(
+    stype: SType,
+    rule: _StypeRule,
+    operation: tuple[tuple[int, ...], tuple[int, ...], tuple, dict],
+    dtype: np.dtype,
+    signature: Any,  # noqa: ANN401
+) -> SType | None:
+    """Return the stype of the result of an operation derived by 'rule'; None, if it can't be derived.
+
+    'operation' are the fields of a _ShapeOperation (built only if the
+    stype has to be derived). 'signature' is a hashable summary of the arguments which determines the
+    result together with the shapes. The derived stypes are memoized per
+    stype by it (not interned by the parse cache); unhashable signatures
+    are derived every time.
+
+    """
+    derivations = stype._derivations  # noqa: SLF001
+    key = (rule, operation[0], operation[1], signature, dtype)
+    try:
+        return derivations[key]
+    except KeyError:
+        if len(derivations) >= DERIVATIONS_MAXSIZE:
+            derivations.clear()
+        derived = derivations[key] = _new_derived_stype(stype, rule, _ShapeOperation(*operation), dtype)
+        return derived
+    except TypeError:
+        return _new_derived_stype(stype, rule, _ShapeOperation(*operation), dtype)
+
+
+def _new_derived_stype(stype: SType, rule: _StypeRule, operation: _ShapeOperation, dtype: np.dtype) -> SType | None:
+    """Derive the stype of the result of an operation (see _derived_stype()).
+
+    A DSType keeps its dtype if the dtype of the result ('dtype') matches it.
+    If no element changed, 'stype' itself is returned.
+
+    """
+    elements = _expanded_elements(stype, operation.shape)
+    if elements is None:
+        return None
+    derived = rule(elements, operation)
+    if derived is None:
+        return None
+    keep_dtype = isinstance(stype, DSType) and stype.check_dtype(dtype)
+    if derived == elements and (keep_dtype or type(stype) is SType):
+        return stype
+    derived = SType._from_elements(derived)  # noqa: SLF001
+    return DSType._from_stype(stype.dtype, derived) if keep_dtype else derived  # noqa: SLF001
+
+
+def _auto_checked_method(name: str) -> Any:  # noqa: ANN401
+    """Build a method of sndarray which derives the stype of or runs the auto shape check on ndarray.<name>."""
+    base_method = getattr(np.ndarray, name)
+    rule = _STYPE_RULES.get(name)
+
+    @functools.wraps(base_method)
+    def method(self: sndarray, *args, **kwargs) -> Any:  # noqa: ANN401
+        result = base_method(self, *args, **kwargs)
+        if result is self or result is kwargs.get("out") or (args and any(result is arg for arg in args)):
+            # in place or into a given output array, which keeps its own stype
+            return result
+        if rule is not None and not self.auto_shape_check and self._stype is not None and isinstance(result, sndarray):
+            operation = (self.shape, result.shape, args, kwargs)
+            signature = (args, *kwargs.items())
+            result._stype = _derived_stype(self._stype, rule, operation, result.dtype, signature)  # noqa: SLF001
+            return result
+        return self._auto_check(result)
+
+    return method
+
+
+_SHAPE_CHANGING_METHODS = (
+    "argmax",
+    "argmin",
+    "astype",
+    "choose",
+    "compress",
+    "diagonal",
+    "dot",
+    "flatten",
+    "ravel",
+    "repeat",
+    "reshape",
+    "searchsorted",
+    "squeeze",
+    "swapaxes",
+    "take",
+    "transpose",
+)
+"""ndarray methods which may change the shape (or the dtype) without calling __array_ufunc__."""
+
+for _name in _SHAPE_CHANGING_METHODS:
+    setattr(sndarray, _name, _auto_checked_method(_name))
+
+
+class ShapeViolation(NamedTuple):
+    """Array shape which does not match the stype of the array."""
+
+    shape: tuple[int, ...]
+    stype: SType
+
+
+_deferred_arrays: contextvars.ContextVar[weakref.WeakValueDictionary | None] = contextvars.ContextVar(
+    "_deferred_arrays",
+    default=None,
+)
+"""Arrays to check at the end of the innermost deferred_shape_checks() scope."""
+
+
+@contextlib.contextmanager
+def deferred_shape_checks(*, raise_error: bool = True) -> Iterator[list[ShapeViolation]]:
+    """Defer the automatic shape checks of sndarray to the end of a scope.
+
+    Inside the scope, results of operations are not checked by
+    'auto_shape_check' but recorded by weak references. At the end of the
+    scope, each recorded array which is still alive is checked once against
+    its stype. All violations are reported together. If the scope is left by
+    an exception, nothing is checked.
+
+    The scope is bound to the current thread or asyncio task (contextvars).
+
+    Parameters
+    ----------
+    raise_error : bool, optional
+        Raise a ShapeError if there are violations, by default True
+
+    Yields
+    ------
+    list[ShapeViolation]
+        The violations; filled at the end of the scope.
+
+    Raises
+    ------
+    ShapeError
+        at the end of the scope if a recorded array does not match its stype
+        and 'raise_error' is set. Its 'violations' attribute is the list of
+        violations.
+
+    """
+    touched = weakref.WeakValueDictionary()
+    violations: list[ShapeViolation] = []
+    token = _deferred_arrays.set(touched)
+    try:
+        yield violations
+    finally:
+        _deferred_arrays.reset(token)
+    for array in list(touched.values()):
+        stype = array.stype
+        if stype is not None and not stype.check_ndarray(array):
+            violations.append(ShapeViolation(array.shape, stype))
+    if violations and raise_error:
+        lines = "".join(f"\n  shape {v.shape} does not match stype {v.stype}" for v in violations)
+        error = ShapeError(f"{len(violations)} array(s) with invalid shape:{lines}")
+        error.violations = violations
+        raise error
+
+
+#
+# .npy files
+# ----------
+#
+
+
+def read_npy_header(path: str | os.PathLike) -> tuple[tuple[int, ...], np.dtype]:
+    """Return shape and dtype of a '.npy' file; only its header is read.
+
+    Raises
+    ------
+    ValueError
+        if the file has an unknown format version or an invalid header
+
+    """
+    with open(path, "rb") as file:  # noqa: PTH123
+        version = np.lib.format.read_magic(file)
+        if version == (1, 0):
+            shape, _, dtype = np.lib.format.read_array_header_1_0(file)
+        elif version == (2, 0):
+            shape, _, dtype = np.lib.format.read_array_header_2_0(file)
+        elif version == (3, 0):
+            # version 3.0 has the layout of 2.0, but an utf8 instead of a latin1 header
+            # (numpy reads it by a private function only)
+            (length,) = struct.unpack("<I", file.read(4))
+            try:
+                header = ast.literal_eval(file.read(length).decode("utf8"))
+                shape, dtype = tuple(header["shape"]), np.lib.format.descr_to_dtype(header["descr"])
+            except (SyntaxError, TypeError, KeyError, ValueError) as error:
+                msg = f"Cannot parse the header of '{os.fspath(path)}'."
+                raise ValueError(msg) from error
+        else:
+            msg = f"Unknown format version {version[0]}.{version[1]} of '{os.fspath(path)}'."
+            raise ValueError(msg)
+    return shape, dtype
+
+
+def load_npy(
+    path: str | os.PathLike,
+    stype: STypeLike | DSType | str | tuple,
+    *,
+    mode: Literal["r", "r+", "c"] = "r",
+    auto_shape_check: bool = False,
+) -> sndarray:
+    """Open a '.npy' file as sndarray backed by a np.memmap.
+
+    Shape and dtype stored in the file are checked against 'stype' before
+    the file is mapped, so no data page is touched for a wrong file. The
+    stype is attached to the array and kept by slices and views.
+
+    Parameters
+    ----------
+    path : str | os.PathLike
+        '.npy' file
+    stype : STypeLike | DSType | str | tuple
+        Shape type (or dtype and shape type, e.g. "float32[:, 3]") of the array
+    mode : Literal["r", "r+", "c"], optional
+        Memory map mode, see np.memmap, by default "r"
+    auto_shape_check : bool, optional
+        Set 'auto_shape_check' of the array, by default False
+
+    Returns
+    -------
+    sndarray
+        The array; its base is the np.memmap.
+
+    Raises
+    ------
+    ShapeError
+        if shape or dtype stored in the file do not match 'stype'
+
+    """
+    stype = _as_stype(stype)
+    shape, dtype = read_npy_header(path)
+    if not stype._matcher(shape) or (isinstance(stype, DSType) and not stype.check_dtype(dtype)):  # noqa: SLF001
+        msg = f"File '{os.fspath(path)}' with shape {shape} and dtype {dtype} does not match stype {stype}."
+        raise ShapeError(msg)
+    array = np.load(path, mmap_mode=mode).view(sndarray)
+    array.stype = stype
+    array.auto_shape_check = auto_shape_check
+    return array
+
+
+_SHARED_MAGIC = b"NPSTSHM1"
+_SHARED_ALIGNMENT = 64
+"""Alignment of the data block behind the header in shared memory."""
+
+
+class _SharedMemory(shared_memory.SharedMemory):
+    """SharedMemory which stays mapped if it is garbage collected while arrays still use it."""
+
+    def __del__(self) -> None:
+        """Close, unless the mapping is exported; then it is unmapped with its last user."""
+        with contextlib.suppress(BufferError):
+            super().__del__()
+
+
+class SharedSndarray:
+    """sndarray in shared memory (multiprocessing.shared_memory).
+
+    The shared memory block starts with a header (magic, length and a pickle
+    of shape, dtype, stype and 'auto_shape_check'), followed by the data. A
+    process attaches by the name of the block and gets a sndarray view of the
+    data without a copy and without checking the shape again; it was checked
+    by the creator.
+
+    Pickling a SharedSndarray (e.g. as argument of a task of a process pool)
+    pickles the name only; unpickling attaches.
+
+    All views of 'array' have to be deleted before close() is called.
+
+    """
+
+    def __init__(self, shm: shared_memory.SharedMemory, flat: np.ndarray, array: sndarray) -> None:
+        """Wrap a shared memory block and its array; use create(), from_array() or attach()."""
+        self.shm = shm
+        self._flat = flat
+        self.array = array
+
+    @classmethod
+    def create(
+        cls,
+        shape: tuple[int, ...],
+        dtype: np.dtype | type | str,
+        stype: STypeLike | DSType | str | tuple | None = None,
+        *,
+        name: str | None = None,
+        auto_shape_check: bool = False,
+    ) -> "SharedSndarray":
+        """Create a shared memory block for an uninitialized array.
+
+        Raises
+        ------
+        ShapeError
+            if 'shape' or 'dtype' do not match 'stype'
+
+        """
+        dtype = np.dtype(dtype)
+        if dtype.hasobject:
+            msg = "Arrays of Python objects can't be shared."
+            raise ValueError(msg)
+        shape = tuple(operator.index(size) for size in shape)
+        stype = None if stype is None else _as_stype(stype)
+        if stype is not None and not (
+            stype._matcher(shape) and (not isinstance(stype, DSType) or stype.check_dtype(dtype))  # noqa: SLF001
+        ):
+            msg = f"Shape {shape} and dtype {dtype} do not match stype {stype}."
+            raise ShapeError(msg)
+        header = pickle.dumps((shape, np.lib.format.dtype_to_descr(dtype), stype, auto_shape_check))
+        offset = -(-(16 + len(header)) // _SHARED_ALIGNMENT) * _SHARED_ALIGNMENT
+        size = offset + math.prod(shape) * dtype.itemsize
+        shm = _SharedMemory(name=name, create=True, size=size)
+        shm.buf[:8] = _SHARED_MAGIC
+        struct.pack_into("<Q", shm.buf, 8, len(header))
+        shm.buf[16 : 16 + len(header)] = header
+        return cls(shm, *_shared_view(shm, shape, dtype, offset, stype=stype, auto_shape_check=auto_shape_check))
+
+    @classmethod
+    def from_array(
+        cls,
+        array: ArrayLike,
+        stype: STypeLike | DSType | str | tuple | None = None,
+        *,
+        name: str | None = None,
+        auto_shape_check: bool = False,
+    ) -> "SharedSndarray":
+        """Create a shared memory block with a copy of 'array'.
+
+        Without 'stype', the stype of a sndarray is used.
+
+        """
+        array = np.asanyarray(array)
+        if stype is None:
+            stype = getattr(array, "stype", None)
+        shared = cls.create(array.shape, array.dtype, stype, name=name, auto_shape_check=auto_shape_check)
+        shared.array.view(np.ndarray)[...] = array
+        return shared
+
+    @classmethod
+    def attach(cls, name: str) -> "SharedSndarray":
+        """Attach to the shared memory block 'name' created by another process."""
+        if sys.version_info >= (3, 13):
+            shm = _SharedMemory(name=name, track=False)
+        else:
+            # only the creator may unlink the block at exit; unregistering after
+            # the attach would drop the creator's entry, too, if the tracker is
+            # shared with a forked process, so the attach isn't registered at all
+            register = resource_tracker.register
+            resource_tracker.register = lambda *_: None
+            try:
+                shm = _SharedMemory(name=name)
+            finally:
+                resource_tracker.register = register
+        if bytes(shm.buf[:8]) != _SHARED_MAGIC:
+            shm.close()
+            msg = f"Shared memory '{name}' does not contain a sndarray."
+            raise ValueError(msg)
+        (length,) = struct.unpack_from("<Q", shm.buf, 8)
+        shape, descr, stype, auto_shape_check = pickle.loads(bytes(shm.buf[16 : 16 + length]))  # noqa: S301, written by SharedSndarray.create()
+        offset = -(-(16 + length) // _SHARED_ALIGNMENT) * _SHARED_ALIGNMENT
+        dtype = np.lib.format.descr_to_dtype(descr)
+        return cls(shm, *_shared_view(shm, shape, dtype, offset, stype=stype, auto_shape_check=auto_shape_check))
+
+    @property
+    def name(self) -> str:
+        """Name of the shared memory block."""
+        return self.shm.name
+
+    def close(self) -> None:
+        """Close the access to the shared memory block in this process.
+
+        Raises
+        ------
+        BufferError
+            if views of 'array' are still alive; 'array' is then kept usable
+
+        """
+        # the array itself is not counted as a view; it is rebuilt on an error
+        layout = None
+        if self.array is not None:
+            layout = self.array.shape, self.array._stype, self.array.auto_shape_check  # noqa: SLF001
+            self.array = None
+        if self._flat is not None and sys.getrefcount(self._flat) > 2:  # noqa: PLR2004, attribute and argument
+            if layout is not None:
+                shape, stype, auto_shape_check = layout
+                self.array = self._flat.reshape(shape).view(sndarray)
+                self.array._stype = stype  # noqa: SLF001
+                self.array.auto_shape_check = auto_shape_check
+            msg = "Views of the shared array are still alive; delete them before close()."
+            raise BufferError(msg)
+        self._flat = None
+        self.shm.close()
+
+    def unlink(self) -> None:
+        """Free the shared memory block; call it once, after all processes closed it."""
+        self.shm.unlink()
+
+    def __enter__(self) -> "Self":
+        """Use the shared array as context manager; it is closed at exit."""
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        """Close the access to the shared memory block."""
+        self.close()
+
+    def __reduce__(self) -> tuple:
+        """Pickle the name only; unpickling attaches to the block."""
+        return (SharedSndarray.attach, (self.name,))
+
+
+def _shared_view(
+    shm: shared_memory.SharedMemory,
+    shape: tuple[int, ...],
+    dtype: np.dtype,
+    offset: int,
+    *,
+    stype: SType | None,
+    auto_shape_check: bool,
+) -> tuple[np.ndarray, sndarray]:
+    """Return the flat base array and the sndarray view of the data in a shared memory block.
+
+    The data is exported by a ctypes array (numpy itself doesn't hold the
+    buffer), so the block can't be unmapped while an array uses it.
+
+    """
+    count = math.prod(shape)
+    buffer = (ctypes.c_byte * (count * dtype.itemsize)).from_buffer(shm.buf, offset)
+    flat = np.frombuffer(buffer, dtype, count)
+    array = flat.reshape(shape).view(sndarray)
+    array._stype = stype  # noqa: SLF001
+    array.auto_shape_check = auto_shape_check
+    return flat, array
 
 
 #
 # Ending: sndarray (shape typed numpy.ndarray)
 #
 # ############################################################
+
+# ############################################################
+#
+# ElementType (types of the elements of object arrays)
+# ====================================================
+#
+# Restricts the Python types of the elements of arrays with dtype 'O'
+# (e.g. "every element is a datetime.datetime"). It has the same check
+# method as SType, so both can be used side by side.
+#
+# The elements are not checked by isinstance() one by one. Instead, the set
+# of their types is collected by C loops (set(map(type, chunk))) chunk by
+# chunk, and each new type is checked by issubclass() once and cached. The
+# check stops after the first chunk with a rejected type. Optionally, only a
+# random sample of the elements is checked.
+#
+# Arrays of other dtypes are checked by their scalar type (dtype.type), so
+# e.g. ElementType(np.floating) accepts float32 and float64 arrays.
+
+ELEMENT_CHUNK_SIZE = 65536
+"""Default number of elements of an object array scanned at once by ElementType."""
+
+
+class ElementType:
+    """Restriction of the types of the elements of a numpy array.
+
+    Parameters
+    ----------
+    *types : type
+        Accepted types (subclasses are accepted, too)
+    sample : int | None, optional
+        Check a random sample of this number of elements only, by default
+        None (check all elements)
+    chunk_size : int, optional
+        Number of elements scanned at once, by default ELEMENT_CHUNK_SIZE
+    seed : int | None, optional
+        Seed of the random generator for 'sample', by default None
+
+    """
+
+    def __init__(
+        self,
+        *types: type,
+        sample: int | None = None,
+        chunk_size: int = ELEMENT_CHUNK_SIZE,
+        seed: int | None = None,
+    ) -> None:
+        """Create an element type restriction."""
+        if not types or not all(isinstance(t, type) for t in types):
+            msg = "ElementType needs at least one type."
+            raise TypeError(msg)
+        if sample is not None and operator.index(sample) < 1:
+            msg = "'sample' has to be None or a positive integer."
+            raise ValueError(msg)
+        if operator.index(chunk_size) < 1:
+            msg = "'chunk_size' has to be a positive integer."
+            raise ValueError(msg)
+        self.types = types
+        self.sample = sample
+        self.chunk_size = chunk_size
+        self._rng = np.random.default_rng(seed)
+        self._accepted: dict[type, bool] = {}
+
+    def __repr__(self) -> str:
+        """Return the representation of the restriction."""
+        names = ", ".join(t.__qualname__ for t in self.types)
+        return f"ElementType({names})" if self.sample is None else f"ElementType({names}, sample={self.sample})"
+
+    def __eq__(self, other: object) -> bool:
+        """Compare the accepted types and the sample size."""
+        if not isinstance(other, ElementType):
+            return NotImplemented
+        return set(self.types) == set(other.types) and self.sample == other.sample
+
+    def __hash__(self) -> int:
+        """Hash of the accepted types and the sample size."""
+        return hash((frozenset(self.types), self.sample))
+
+    def _accepts(self, types: Iterable[type]) -> bool:
+        """Check types of elements; uses and fills the cache of checked types."""
+        accepted = self._accepted
+        for t in types:
+            ok = accepted.get(t)
+            if ok is None:
+                ok = accepted[t] = issubclass(t, self.types)
+            if not ok:
+                return False
+        return True
+
+    def check_ndarray(self, array: ArrayLike) -> bool:
+        """Check the types of the elements of a numpy array(-like) object.
+
+        The return value is a boolean. No Exception will be raised if
+        a type is not correct. Empty arrays are valid.
+
+        """
+        array = np.asarray(array)
+        if array.dtype != object:
+            return self._accepts((array.dtype.type,))
+        flat = array.reshape(-1)
+        if self.sample is not None and self.sample < flat.size:
+            flat = flat[self._rng.integers(0, flat.size, self.sample)]
+        chunk_size = self.chunk_size
+        for start in range(0, flat.size, chunk_size):
+            if not self._accepts(set(map(type, flat[start : start + chunk_size]))):
+                return False
+        return True
+
+
+#
+# Ending: ElementType
+#
+# ############################################################
+
+# ############################################################
+#
+# datetime64 / timedelta64 conversion
+# ===================================
+#
+# numpy's datetime64 and timedelta64 carry a time unit. Converted with
+# .astype(object), only the unit 'us' (the resolution of the datetime module)
+# gives datetime.datetime/datetime.timedelta objects; other units give
+# integers in that unit, and values out of range wrap around silently.
+#
+# The functions below normalize the unit once per array: the values are
+# range checked on the int64 buffer first, then the whole array is cast to
+# 'us' and converted by numpy's C loops. The opposite direction subtracts
+# the epoch from all objects at once and collects days, seconds and
+# microseconds of the differences into int64 arrays. Shape and the
+# attributes of sndarray (stype, auto check) are kept.
+
+_EPOCH = dt.datetime(1970, 1, 1)  # noqa: DTZ001, numpy datetime64 is naive
+_INT64_MAX = 2**63 - 1
+"""Largest int64 value; the smallest one is NaT."""
+_UNIT_MICROSECONDS = {
+    "W": Fraction(7 * 86400 * 10**6),
+    "D": Fraction(86400 * 10**6),
+    "h": Fraction(3600 * 10**6),
+    "m": Fraction(60 * 10**6),
+    "s": Fraction(10**6),
+    "ms": Fraction(10**3),
+    "us": Fraction(1),
+    "ns": Fraction(1, 10**3),
+    "ps": Fraction(1, 10**6),
+    "fs": Fraction(1, 10**9),
+    "as": Fraction(1, 10**12),
+}
+_UNIT_MONTHS = {"Y": 12, "M": 1}
+_DATETIME_MICROSECONDS = (
+    (dt.datetime.min - _EPOCH) // dt.timedelta(microseconds=1),  # noqa: DTZ901
+    (dt.datetime.max - _EPOCH) // dt.timedelta(microseconds=1),  # noqa: DTZ901
+)
+"""Range of datetime.datetime in microseconds since the epoch."""
+_DATETIME_MONTHS = ((1 - 1970) * 12, (9999 - 1970) * 12 + 11)
+"""Range of datetime.datetime in months since the epoch."""
+_TIMEDELTA_DAYS = _INT64_MAX // (86400 * 10**6)
+"""Range of timedelta64[us] in days (rounded down)."""
+
+
+def _unit_size(dtype: np.dtype) -> tuple[Fraction, bool]:
+    """Return the length of the unit of a datetime64/timedelta64 dtype and if it is given in months (or in microseconds)."""
+    unit, count = np.datetime_data(dtype)
+    if unit in _UNIT_MONTHS:
+        return Fraction(_UNIT_MONTHS[unit] * count), True
+    if unit not in _UNIT_MICROSECONDS:
+        msg = f"{dtype} has no time unit."
+        raise ValueError(msg)
+    return _UNIT_MICROSECONDS[unit] * count, False
+
+
+def _all_in_range(array: np.ndarray, low: Fraction | int, high: Fraction | int) -> bool:
+    """Check that all values of a datetime64/timedelta64 array (but NaT) lie in [low, high] (given in 'us' or months, see _unit_size())."""
+    size, _ = _unit_size(array.dtype)
+    low = max(math.ceil(low / size), -_INT64_MAX)
+    high = min(math.floor(high / size), _INT64_MAX)
+    values = array.view(np.int64)
+    return bool((((values >= low) & (values <= high)) | np.isnat(array)).all())
+
+
+def _with_attributes_of(result: np.ndarray, template: np.ndarray) -> np.ndarray:
+    """Give a new array the shape of 'template' and, if it is a sndarray, its attributes."""
+    result = result.reshape(template.shape)
+    if isinstance(template, sndarray):
+        result = result.view(sndarray)
+        result._stype = template._stype  # noqa: SLF001
+        result.auto_shape_check = template.auto_shape_check
+        result.auto_check_policy = template.auto_check_policy
+    return result
+
+
+def _to_unit(array: np.ndarray, kind: str, unit: str) -> np.ndarray:
+    """Cast a datetime64[us]/timedelta64[us] array into another unit; raises ValueError on overflow."""
+    dtype = np.dtype(f"{kind}64[{unit}]")
+    if dtype == array.dtype:
+        return array
+    size, months = _unit_size(dtype)
+    if months and kind == "timedelta":
+        msg = "Years and months are not a fixed time span."
+        raise ValueError(msg)
+    if not months and size < 1 and not _all_in_range(array, -_INT64_MAX * size, _INT64_MAX * size):
+        msg = f"Values out of the range of {dtype}."
+        raise ValueError(msg)
+    return array.astype(dtype)
+
+
+def _microseconds(deltas: np.ndarray) -> np.ndarray:
+    """Return a flat object array of timedelta objects as int64 microseconds; raises TypeError for other objects."""
+    count = deltas.size
+    try:
+        days = np.fromiter(map(operator.attrgetter("days"), deltas), np.int64, count)
+        seconds = np.fromiter(map(operator.attrgetter("seconds"), deltas), np.int64, count)
+        microseconds = np.fromiter(map(operator.attrgetter("microseconds"), deltas), np.int64, count)
+    except AttributeError as error:
+        raise TypeError(error) from error
+    if count and (days.min() < -_TIMEDELTA_DAYS or days.max() >= _TIMEDELTA_DAYS):
+        msg = "Values out of the range of timedelta64[us]."
+        raise ValueError(msg)
+    return (days * 86400 + seconds) * 10**6 + microseconds
+
+
+def datetime64_to_datetime(array: ArrayLike) -> np.ndarray:
+    """Convert a datetime64 array of any unit into an object array of datetime.datetime.
+
+    Units finer than microseconds are truncated (rounded down), NaT becomes
+    None. The shape and the attributes of sndarray are kept.
+
+    Raises
+    ------
+    TypeError
+        if the array has not dtype datetime64
+    ValueError
+        if a value is out of the range of datetime.datetime
+
+    """
+    array = np.asanyarray(array)
+    if array.dtype.kind != "M":
+        msg = f"Expected a datetime64 array, got dtype {array.dtype}."
+        raise TypeError(msg)
+    _, months = _unit_size(array.dtype)
+    if not _all_in_range(array, *(_DATETIME_MONTHS if months else _DATETIME_MICROSECONDS)):
+        msg = "Values out of the range of datetime.datetime."
+        raise ValueError(msg)
+    return array.astype("datetime64[us]").astype(object)
+
+
+def timedelta64_to_timedelta(array: ArrayLike) -> np.ndarray:
+    """Convert a timedelta64 array of any fixed unit into an object array of datetime.timedelta.
+
+    Units finer than microseconds are truncated (rounded down), NaT becomes
+    None. The shape and the attributes of sndarray are kept.
+
+    Raises
+    ------
+    TypeError
+        if the array has not dtype timedelta64
+    ValueError
+        if the unit is years or months, or a value is out of the range of timedelta64[us]
+
+    """
+    array = np.asanyarray(array)
+    if array.dtype.kind != "m":
+        msg = f"Expected a timedelta64 array, got dtype {array.dtype}."
+        raise TypeError(msg)
+    _, months = _unit_size(array.dtype)
+    if months:
+        msg = "Years and months are not a fixed time span."
+        raise ValueError(msg)
+    if not _all_in_range(array, -_INT64_MAX, _INT64_MAX):
+        msg = "Values out of the range of timedelta64[us]."
+        raise ValueError(msg)
+    return array.astype("timedelta64[us]").astype(object)
+
+
+def datetime_to_datetime64(array: ArrayLike, unit: str = "us") -> np.ndarray:
+    """Convert an array(-like) of datetime.datetime into a datetime64 array.
+
+    Naive datetimes are converted in bulk. Other values (None, datetime.date,
+    time zone aware datetimes, strings, ...) are converted by numpy for the
+    whole array, which is much slower. The shape and the attributes of
+    sndarray are kept.
+
+    Parameters
+    ----------
+    array : ArrayLike
+        Array of datetime.datetime objects
+    unit : str, optional
+        Time unit of the result, by default "us" (exact)
+
+    Raises
+    ------
+    ValueError
+        if a value is out of the range of the unit
+
+    """
+    objects = np.asanyarray(array, dtype=object)
+    try:
+        microseconds = _microseconds(np.asarray(objects).reshape(-1) - _EPOCH)
+    except TypeError:
+        result = objects.astype("datetime64[us]")
+    else:
+        result = _with_attributes_of(microseconds.view("datetime64[us]"), objects)
+    return _to_unit(result, "datetime", unit)
+
+
+def timedelta_to_timedelta64(array: ArrayLike, unit: str = "us") -> np.ndarray:
+    """Convert an array(-like) of datetime.timedelta into a timedelta64 array.
+
+    timedelta objects are converted in bulk. Other values (None, integers,
+    ...) are converted by numpy for the whole array, which is much slower.
+    The shape and the attributes of sndarray are kept.
+
+    Parameters
+    ----------
+    array : ArrayLike
+        Array of datetime.timedelta objects
+    unit : str, optional
+        Time unit of the result, by default "us" (exact)
+
+    Raises
+    ------
+    ValueError
+        if the unit is years or months, or a value is out of the range of the unit
+
+    """
+    objects = np.asanyarray(array, dtype=object)
+    try:
+        microseconds = _microseconds(np.asarray(objects).reshape(-1))
+    except TypeError:
+        result = objects.astype("timedelta64[us]")
+    else:
+        result = _with_attributes_of(microseconds.view("timedelta64[us]"), objects)
+    return _to_unit(result, "timedelta", unit)
+
+
+#
+# Ending: datetime64 / timedelta64 conversion
+#
+# ############################################################
+
+# ############################################################
+#
+# check_shapes (function decorator)
+# =================================
+#
+# Checks the shapes of arguments and of the return value of a function on
+# each call. The shape types are given
+#
+#   -   as decorator arguments:  @check_shapes(x="(:, 3)", returns=(":",))
+#   -   or as annotations:       def f(x: Annotated[np.ndarray, SType("(:, 3)")])
+#
+# Decorator arguments have priority over annotations. All shape types are
+# converted into SType once at decoration time; a call only reads the checked
+# arguments by position or name and calls the compiled shape matchers.
+#
+# With DO_TYPECHECK == False (Python started with '-O') the decorator returns
+# the original function, so there is no cost per call at all. Since the value
+# of DO_TYPECHECK is read at decoration time, it has to be changed before the
+# decorated functions are defined.
+
+
+class _CheckedParameter(NamedTuple):
+    """Compiled shape check of one function parameter."""
+
+    name: str
+    index: int | None
+    """Position in '*args' or None, if the parameter is keyword-only."""
+    stype: SType
+
+
+def _annotated_stypes(func: Callable) -> dict[str, SType]:
+    """Return the STypes given by 'Annotated[..., SType(...)]' annotations of func."""
+    try:
+        hints = get_type_hints(func, include_extras=True)
+    except Exception:  # noqa: BLE001
+        # unresolvable forward references: use the raw annotations
+        hints = getattr(func, "__annotations__", {})
+    stypes = {}
+    for name, hint in hints.items():
+        if isinstance(hint, SType):
+            stypes[name] = hint
+        elif get_origin(hint) is Annotated:
+            for meta in hint.__metadata__:
+                if isinstance(meta, SType):
+                    stypes[name] = meta
+                    break
+    return stypes
+
+
+def _check_value(
+    value: object,
+    stype: SType,
+    name: str,
+    func: Callable,
+    bindings: dict[str, int] | None,
+) -> None:
+    """Raise a ShapeError if value doesn't match stype (and the bindings of symbolic dimensions)."""
+    if bindings is None:
+        if stype.check_ndarray(value):
+            return
+        with_bindings = ""
+    else:
+        if stype.bind(value, bindings):
+            return
+        with_bindings = f" with bindings {bindings}"
+    msg = (
+        f"{func.__qualname__}(): '{name}' with shape {np.shape(value)} "
+        f"does not match stype {stype}{with_bindings}."
+    )
+    raise ShapeError(msg)
+
+
+def _compile_shape_checks(
+    func: Callable,
+    stype_likes: dict[str, STypeLike],
+    returns: STypeLike | None,
+) -> tuple[tuple[_CheckedParameter, ...], SType | None]:
+    """Convert the shape types of func's parameters and return value into SType."""
+    stypes = _annotated_stypes(func)
+    stypes.update({name: _as_stype(stype_like) for name, stype_like in stype_likes.items()})
+    return_stype = stypes.pop("return", None)
+    if returns is not None:
+        return_stype = _as_stype(returns)
+
+    parameters = inspect.signature(func).parameters
+    checked = []
+    for name, stype in stypes.items():
+        if name not in parameters:
+            msg = f"{func.__qualname__}() has no parameter '{name}' to check."
+            raise TypeError(msg)
+        parameter = parameters[name]
+        if parameter.kind in (parameter.VAR_POSITIONAL, parameter.VAR_KEYWORD):
+            msg = f"Shape check of '*{name}' or '**{name}' is not supported."
+            raise TypeError(msg)
+        index = (
+            None
+            if parameter.kind == parameter.KEYWORD_ONLY
+            else list(parameters).index(name)
+        )
+        checked.append(_CheckedParameter(name, index, stype))
+    return tuple(checked), return_stype
+
+
+def _shape_checking_wrapper(
+    func: Callable,
+    checked: tuple[_CheckedParameter, ...],
+    return_stype: SType | None,
+) -> Callable:
+    """Wrap func into a function checking the compiled shape types on each call.
+
+    If symbolic dimensions are used, all arguments and the return value of
+    one call are checked with one common dict of bindings.
+
+    """
+    symbolic = any(
+        stype._layout.symbols  # noqa: SLF001
+        for stype in (*(c.stype for c in checked), return_stype or SType(()))
+    )
+
+    def check_arguments(args: tuple, kwargs: dict) -> dict[str, int] | None:
+        bindings = {} if symbolic else None
+        for name, index, stype in checked:
+            if index is not None and index < len(args):
+                _check_value(args[index], stype, name, func, bindings)
+            elif name in kwargs:
+                _check_value(kwargs[name], stype, name, func, bindings)
+        return bindings
+
+    if inspect.iscoroutinefunction(func):
+
+        @functools.wraps(func)
+        async def async_wrapper(*args, **kwargs) -> Any:  # noqa: ANN401
+            bindings = check_arguments(args, kwargs)
+            result = await func(*args, **kwargs)
+            if return_stype is not None:
+                _check_value(result, return_stype, "return value", func, bindings)
+            return result
+
+        return async_wrapper
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs) -> Any:  # noqa: ANN401
+        bindings = check_arguments(args, kwargs)
+        result = func(*args, **kwargs)
+        if return_stype is not None:
+            _check_value(result, return_stype, "return value", func, bindings)
+        return result
+
+    return wrapper
+
+
+def check_shapes(
+    func: Callable | None = None,
+    /,
+    *,
+    returns: STypeLike | None = None,
+    **stype_likes: STypeLike,
+) -> Callable:
+    """Check the shapes of arguments and return value of a function on each call.
+
+    Can be used with or without arguments:
+
+        @check_shapes
+        def f(x: Annotated[np.ndarray, SType("(:, 3)")]) -> Annotated[np.ndarray, SType(":")]: ...
+
+        @check_shapes(x="(:, 3)", returns=":")
+        def f(x): ...
+
+    A failing check raises a ShapeError. Arguments which are not passed (default
+    values) are not checked.
+
+    Parameters
+    ----------
+    func : Callable | None, optional
+        The decorated function, if used without arguments
+    returns : STypeLike | None, optional
+        Shape type of the return value. Overwrites a return annotation,
+        by default None
+    **stype_likes : STypeLike
+        Shape types of parameters by parameter name. Overwrite annotations.
+
+    Returns
+    -------
+    Callable
+        The checking function or, with DO_TYPECHECK == False, the original
+        function.
+
+    """
+
+    def decorator(func: Callable) -> Callable:
+        if not DO_TYPECHECK:
+            return func
+        checked, return_stype = _compile_shape_checks(func, stype_likes, returns)
+        return _shape_checking_wrapper(func, checked, return_stype)
+
+    if func is not None:
+        return decorator(func)
+    return decorator
+
+
+#
+# Ending: check_shapes (function decorator)
+#
+# ############################################################
+
+
+# ############################################################
+#
+# StreamCheck (validation of streams of array chunks)
+# ===================================================
+#
+# Validates the chunks of a (sync or async) iterator while they pass through
+# a pipeline:
+#
+#     for chunk in StreamCheck(reader, "(:, 128)", rows=10_000): ...
+#     async for chunk in StreamCheck(areader, "(:, 128)"): ...
+#
+# Each chunk is checked by SType.check_ndarray() (by SType.bind(), if the
+# SType has symbolic dimensions; their sizes are then bound across all chunks
+# of the stream). Additionally, aggregate constraints of the whole stream are
+# checked on the fly: the total number of rows (sizes of the first axes) and
+# the same trailing dimensions of all chunks. Only the counters, the trailing
+# dimensions of the first chunk and the bindings are kept, so the memory is
+# constant; no chunk is buffered.
+#
+# A failing check raises a ShapeError at the failing chunk; a wrong total of
+# rows as soon as it is exceeded or at the end of the stream.
+#
+
+
+class StreamCheck:
+    """Iterator (and async iterator) checking the shapes of the chunks of a stream.
+
+    Parameters
+    ----------
+    chunks : Iterable[ArrayLike] | AsyncIterable[ArrayLike]
+        Chunks to check; iterate with 'for' over an iterable, with
+        'async for' over an async iterable
+    stype : STypeLike | DSType | str | tuple
+        Shape type of each chunk
+    rows : int | range | None, optional
+        Allowed total number of rows of the stream, by default None (any).
+        A 0-dimensional chunk counts as one row.
+    consistent : bool, optional
+        All chunks have to have the same trailing dimensions (all but
+        the first), by default True
+
+    """
+
+    def __init__(
+        self,
+        chunks: Iterable[ArrayLike] | AsyncIterable[ArrayLike],
+        stype: STypeLike | DSType | str | tuple,
+        *,
+        rows: int | range | None = None,
+        consistent: bool = True,
+    ) -> None:
+        """Wrap a stream of chunks."""
+        self.stype = _as_stype(stype)
+        if rows is not None and not isinstance(rows, range):
+            rows = range(operator.index(rows), operator.index(rows) + 1)
+        self.rows = rows
+        self.consistent = consistent
+        self.chunks = chunks
+        self.count = 0
+        """Number of checked chunks."""
+        self.total = 0
+        """Total number of rows of the checked chunks."""
+        self.trailing: tuple[int, ...] | None = None
+        """Trailing dimensions of the first chunk."""
+        self.bindings: dict[str, int] = {}
+        """Sizes of the symbolic dimensions of the SType."""
+
+    def __repr__(self) -> str:
+        """Return the representation with the state of the check."""
+        return (
+            f"StreamCheck(stype={self.stype!r}, rows={self.rows}, count={self.count}, total={self.total})"
+        )
+
+    def _check(self, chunk: ArrayLike) -> ArrayLike:
+        """Check one chunk and update the aggregates; returns the chunk."""
+        stype = self.stype
+        if not (stype.bind(chunk, self.bindings) if stype._layout.symbols else stype.check_ndarray(chunk)):  # noqa: SLF001
+            bindings = f" with bindings {self.bindings}" if self.bindings else ""
+            msg = f"Chunk {self.count} with shape {np.shape(chunk)} does not match stype {stype}{bindings}."
+            raise ShapeError(msg)
+        shape = chunk.shape if isinstance(chunk, np.ndarray) else _probe_shape(chunk)[0]
+        if self.consistent:
+            if self.trailing is None:
+                self.trailing = shape[1:]
+            elif shape[1:] != self.trailing:
+                msg = (
+                    f"Chunk {self.count} with shape {shape} does not have the trailing "
+                    f"dimensions {self.trailing} of the former chunks."
+                )
+                raise ShapeError(msg)
+        self.count += 1
+        self.total += shape[0] if shape else 1
+        if self.rows is not None and self.total >= self.rows.stop:
+            msg = f"The stream exceeds the allowed number of rows {self.rows} with {self.total} rows."
+            raise ShapeError(msg)
+        return chunk
+
+    def _finish(self) -> None:
+        """Check the aggregates at the end of the stream."""
+        if self.rows is not None and self.total not in self.rows:
+            msg = f"The stream has {self.total} rows, but {self.rows} are required."
+            raise ShapeError(msg)
+
+    def __iter__(self) -> Iterator[ArrayLike]:
+        """Iterate over the checked chunks of an iterable."""
+        for chunk in self.chunks:
+            yield self._check(chunk)
+        self._finish()
+
+    async def __aiter__(self) -> AsyncIterator[ArrayLike]:
+        """Iterate over the checked chunks of an async iterable."""
+        async for chunk in self.chunks:
+            yield self._check(chunk)
+        self._finish()
+
+
+#
+# Ending: StreamCheck (validation of streams of array chunks)
+#
+# ############################################################
+
+# ############################################################
+#
+# Instrumentation
+# ===============
+#
+# Opt-in counters and timers for the costs of npstyping:
+#
+#   -   stype   – SType(...) calls (including cache hits)
+#   -   parse   – parsing of STypeLike values (cache misses only)
+#   -   compile – building layout and shape matcher of a new SType
+#   -   check   – SType.check_ndarray() calls, failures and time per SType
+#   -   hook    – automatic shape checks of sndarray (from __array_ufunc__,
+#                 __array_function__ and the shape changing methods)
+#
+# enable_instrumentation() replaces these methods by timing wrappers and
+# disable_instrumentation() restores the originals. So there is no cost at
+# all while it is disabled. The counters are not locked; with several threads
+# they are approximations.
+
+INSTRUMENTATION_EVENTS = ("stype", "parse", "compile", "check", "hook")
+"""Names of the events counted by the instrumentation."""
+
+_InstrumentationCallback = Callable[[str, "SType | None", int, bool], None]
+
+_events: dict[str, list[int]] = {event: [0, 0, 0] for event in INSTRUMENTATION_EVENTS}
+_checks_per_stype: dict[SType, list[int]] = {}
+_instrumentation_callback: _InstrumentationCallback | None = None
+_original_methods: dict[tuple[type, str], Any] = {}
+
+
+def _record(event: str, stype: SType | None, ns: int, ok: bool) -> None:  # noqa: FBT001
+    """Add an event to the counters (calls, failures, nanoseconds) and call the callback."""
+    counters = _events[event]
+    counters[0] += 1
+    counters[1] += not ok
+    counters[2] += ns
+    if event == "check":
+        counters = _checks_per_stype.setdefault(stype, [0, 0, 0])
+        counters[0] += 1
+        counters[1] += not ok
+        counters[2] += ns
+    if _instrumentation_callback is not None:
+        _instrumentation_callback(event, stype, ns, ok)
+
+
+def _instrumented_methods() -> dict[tuple[type, str], Any]:
+    """Build the timing wrappers of the instrumented methods."""
+    original_new = SType.__new__
+    original_to_stype = SType._to_stype  # noqa: SLF001
+    original_from_elements = SType._from_elements.__func__  # noqa: SLF001
+    original_check_ndarray = SType.check_ndarray
+    original_dstype_check_ndarray = DSType.check_ndarray
+    original_auto_check = sndarray._auto_check  # noqa: SLF001
+    clock = time.perf_counter_ns
+
+    def __new__(cls: type[SType], shape: STypeLike) -> SType:  # noqa: N807
+        start = clock()
+        stype = original_new(cls, shape)
+        _record("stype", stype, clock() - start, True)  # noqa: FBT003
+        return stype
+
+    def _to_stype(shape: STypeLike) -> tuple:
+        start = clock()
+        ok = False
+        try:
+            elements = original_to_stype(shape)
+            ok = True
+        finally:
+            _record("parse", None, clock() - start, ok)
+        return elements
+
+    def _from_elements(cls: type[SType], elements: tuple) -> SType:
+        start = clock()
+        stype = original_from_elements(cls, elements)
+        _record("compile", stype, clock() - start, True)  # noqa: FBT003
+        return stype
+
+    def timed_check(original: Callable[[SType, ArrayLike], bool]) -> Callable[[SType, ArrayLike], bool]:
+        def check_ndarray(self: SType, array: ArrayLike) -> bool:
+            start = clock()
+            ok = original(self, array)
+            _record("check", self, clock() - start, ok)
+            return ok
+
+        return check_ndarray
+
+    def _auto_check(self: sndarray, result: Any, sampled: bool | None = None) -> Any:  # noqa: ANN401, FBT001
+        start = clock()
+        ok = False
+        try:
+            result = original_auto_check(self, result, sampled)
+            ok = True
+        finally:
+            _record("hook", self._stype, clock() - start, ok)
+        return result
+
+    return {
+        (SType, "__new__"): staticmethod(__new__),
+        (SType, "_to_stype"): staticmethod(_to_stype),
+        (SType, "_from_elements"): classmethod(_from_elements),
+        (SType, "check_ndarray"): timed_check(original_check_ndarray),
+        (DSType, "check_ndarray"): timed_check(original_dstype_check_ndarray),
+        (sndarray, "_auto_check"): _auto_check,
+    }
+
+
+def enable_instrumentation(callback: _InstrumentationCallback | None = None) -> None:
+    """Start counting and timing the work of npstyping.
+
+    Parameters
+    ----------
+    callback : Callable[[str, SType | None, int, bool], None] | None, optional
+        Called for each event with the event name (see INSTRUMENTATION_EVENTS),
+        the SType (if known), the time in nanoseconds and False on a failure,
+        by default None
+
+    """
+    global _instrumentation_callback  # noqa: PLW0603
+    _instrumentation_callback = callback
+    if _original_methods:
+        return
+    for (cls, name), method in _instrumented_methods().items():
+        _original_methods[cls, name] = cls.__dict__[name]
+        setattr(cls, name, method)
+
+
+def disable_instrumentation() -> None:
+    """Stop counting and timing; restores the original methods. The counters are kept."""
+    global _instrumentation_callback  # noqa: PLW0603
+    _instrumentation_callback = None
+    for (cls, name), method in _original_methods.items():
+        setattr(cls, name, method)
+    _original_methods.clear()
+
+
+def instrumentation_snapshot() -> dict:
+    """Return a copy of the counters.
+
+    Returns
+    -------
+    dict
+        {"enabled": bool, <event>: {"calls", "failures", "ns"}, ...,
+        "checks_per_stype": {SType: {"calls", "failures", "ns"}}}
+
+    """
+    def as_dict(counters: list[int]) -> dict[str, int]:
+        return dict(zip(("calls", "failures", "ns"), counters, strict=True))
+
+    snapshot: dict = {"enabled": bool(_original_methods)}
+    snapshot.update({event: as_dict(counters) for event, counters in _events.items()})
+    snapshot["checks_per_stype"] = {stype: as_dict(c) for stype, c in _checks_per_stype.items()}
+    return snapshot
+
+
+def reset_instrumentation() -> None:
+    """Set all counters to zero."""
+    for counters in _events.values():
+        counters[:] = [0, 0, 0]
+    _checks_per_stype.clear()
+
+
+#
+# Ending: Instrumentation
+#
+# ############################################################
@@ -1,14 +1,45 @@
+import array
+import asyncio
+import datetime
+import pickle
+import random
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from typing import Annotated
+
 import numpy as np
 import pytest
 
+from npstyping import npstyping
 from npstyping.npstyping import (
     _Colon_Meta,
     Colon,
     _STypeLike_Meta,
+    DSType,
     STypeLike,
  #   _SType_Meta,
+    STYPE_CACHE_MAXSIZE,
+    ElementType,
+    SamplingPolicy,
     SType,
+    ShapeError,
+    ShapeViolation,
+    SharedSndarray,
+    StreamCheck,
+    check_shapes,
+    datetime64_to_datetime,
+    datetime_to_datetime64,
+    deferred_shape_checks,
+    disable_instrumentation,
+    enable_instrumentation,
+    instrumentation_snapshot,
+    load_npy,
+    read_npy_header,
+    reset_instrumentation,
+    timedelta64_to_timedelta,
+    timedelta_to_timedelta64,
     sndarray,
+    unify_shapes,
 )
 
 
@@ -142,6 +173,47 @@ def test_STypeLike_input_values_check_negativ(in1):
     assert not isinstance(in1, STypeLike)
 
 
+# isinstance(..., STypeLike) and SType(...) have to agree
+
+STypeLike_agreement_test_list = [
+    ((Colon, 3), (":", 3)),
+    (Colon, (":",)),
+    ((np.int64(3), np.uint8(2)), (3, 2)),
+    ((3.0, ...), (3, ...)),
+    ([], ()),
+    (" ( 3 , : ) ", (3, ":")),
+    ("3,", (3,)),
+    ([3, ..., 3], None),
+    ((..., 3, ...), None),
+    (3.5, None),
+    ((3, "2"), None),
+    ((True, -1), None),
+    ("1 0", None),
+    ("(3]", None),
+    ("[3, ...],", None),
+    (np.array([3, 2]), None),
+]
+
+
+@pytest.mark.parametrize("in1, out1", STypeLike_agreement_test_list)
+def test_STypeLike_agrees_with_SType(in1, out1):
+    assert isinstance(in1, STypeLike) == (out1 is not None)
+    if out1 is None:
+        with pytest.raises(ValueError):
+            SType(in1)
+    else:
+        assert SType(in1) == out1
+
+
+def test_STypeLike_check_and_SType_parse_once():
+    SType.cache_clear()
+    assert isinstance("(:, 3, 10)", STypeLike)
+    assert SType("(:, 3, 10)") == (":", 3, 10)
+    info = SType.cache_info()
+    assert info.misses == 1
+    assert info.hits == 1
+
+
 #
 # Ending: STypeLike
 #
@@ -329,6 +401,381 @@ def test_SType_method_check_ndarray_value_error_exception(in1, in2):
         SType(in1).check_ndarray(in2)
 
 
+def test_SType_cache_interns_instances():
+    SType.cache_clear()
+    a = SType("(:, 3)")
+    b = SType("(:, 3)")
+    assert a is b
+    assert SType([":", 3]) is SType((":", 3))
+    assert SType(a) is a
+    info = SType.cache_info()
+    assert info.hits == 2
+    assert info.misses == 2
+    assert info.currsize == 2
+
+
+def test_SType_cache_unhashable_value():
+    SType.cache_clear()
+    with pytest.raises(ValueError):
+        SType((":", [3]))
+    assert SType.cache_info() == (0, 0, STYPE_CACHE_MAXSIZE, 0)
+
+
+def test_SType_cache_resize_and_clear():
+    SType.cache_clear()
+    try:
+        SType.cache_resize(2)
+        for spec in ("1", "2", "3"):
+            SType(spec)
+        info = SType.cache_info()
+        assert info.maxsize == 2
+        assert info.currsize == 2
+        SType.cache_resize(0)
+        assert SType.cache_info().currsize == 0
+        assert SType("1") == (1,)
+        assert SType.cache_info().currsize == 0
+        with pytest.raises(ValueError):
+            SType.cache_resize(-1)
+    finally:
+        SType.cache_resize(STYPE_CACHE_MAXSIZE)
+    SType.cache_clear()
+    assert SType.cache_info() == (0, 0, STYPE_CACHE_MAXSIZE, 0)
+
+
+def test_SType_cache_threads():
+    SType.cache_clear()
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        results = list(executor.map(SType, ["(:, 3)", "(..., 2)"] * 500))
+    assert all(r == (":", 3) for r in results[::2])
+    assert all(r == (..., 2) for r in results[1::2])
+    assert SType.cache_info().currsize == 2
+
+
+def test_SType_cache_invalid_value_not_cached():
+    SType.cache_clear()
+    for _ in range(2):
+        with pytest.raises(ValueError):
+            SType("(3")
+    assert SType.cache_info().currsize == 0
+
+
+@pytest.mark.parametrize(
+    "in1, in2, out1",
+    [
+        ((), (), True),
+        ((), (1,), False),
+        ((..., 3), (3,), True),
+        ((..., 3), (), False),
+        ((3, ...), (3, 1, 1, 1), True),
+        ((":", ":", ":", 4), (1, 2, 3, 4), True),
+        ((":", ":", ":", 4), (1, 2, 4, 3), False),
+        ((2, ":", 3, 4), (2, 9, 3, 4), True),
+        ((2, ":", 3, 4), (2, 9, 3, 5), False),
+        ((2, ":", 3, 4), (2, 9, 3, 4, 1), False),
+        ((..., 2, ":", 4), (7, 2, 9, 4), True),
+        ((..., 2, ":", 4), (2, 7, 9, 4), False),
+        ((2, ":", 4, ...), (2, 9, 4, 7), True),
+        ((2, ":", 4, ...), (2, 9), False),
+    ],
+)
+def test_SType_compiled_matcher(in1, in2, out1):
+    assert SType(in1).check_ndarray(np.empty(in2)) == out1
+
+
+def test_SType_pickle():
+    a = SType("(..., 3, :)")
+    b = pickle.loads(pickle.dumps(a))
+    assert b == a
+    assert isinstance(b, SType)
+    assert b.check_ndarray(np.empty((2, 3, 1)))
+
+
+check_many_stype_list = [
+    (),
+    (3,),
+    (":", 3),
+    (2, ":", 3, 1),
+    (..., 3),
+    (..., 2, ":", 1),
+    (2, ...),
+    (":", 3, ...),
+    (...,),
+    ("N", range(2, 4), "N"),
+    (..., frozenset({1, 3}), ":"),
+    (range(0, 2), ...),
+]
+
+
+@pytest.mark.parametrize("in1", check_many_stype_list)
+def test_SType_check_many_agrees_with_check_ndarray(in1):
+    rng = np.random.default_rng(0)
+    shapes = [
+        tuple(int(d) for d in rng.integers(1, 4, size=rng.integers(0, 6)))
+        for _ in range(500)
+    ]
+    stype = SType(in1)
+    expected = [stype.check_ndarray(np.empty(shape)) for shape in shapes]
+    assert stype.check_many(shapes).tolist() == expected
+    assert stype.check_many(np.empty(shape) for shape in shapes).tolist() == expected
+
+
+def test_SType_check_many_first_failure():
+    stype = SType("(:, 3)")
+    arrays = [np.ones((2, 3)), [[1, 2, 3]], np.ones((2, 4)), np.ones(3)]
+    mask, first = stype.check_many(arrays, return_first_failure=True)
+    assert mask.tolist() == [True, True, False, False]
+    assert first == 2
+    mask, first = stype.check_many(arrays[:2], return_first_failure=True)
+    assert mask.all()
+    assert first is None
+    assert stype.check_many([]).shape == (0,)
+
+
+@pytest.mark.parametrize(
+    "in1, out1",
+    [
+        ("(N, 3)", ("N", 3)),
+        ("[batch, :, ...]", ("batch", ":", ...)),
+        (("N", ..., "N"), None),
+        (("N", "M"), ("N", "M")),
+        ("(N-1)", None),
+        ("(3N)", None),
+        (("1N",), None),
+    ],
+)
+def test_SType_symbolic_parse(in1, out1):
+    if out1 is None:
+        assert not isinstance(in1, STypeLike)
+    else:
+        assert SType(in1) == out1
+
+
+@pytest.mark.parametrize(
+    "in1, in2, out1",
+    [
+        ("(N, N)", (3, 3), True),
+        ("(N, N)", (3, 4), False),
+        ("(N, 3, N)", (2, 3, 2), True),
+        ("(..., N, N)", (5, 2, 2), True),
+        ("(..., N, N)", (2, 2, 5), False),
+        ("(N, :, N, ...)", (4, 1, 4, 7), True),
+        ("(N, M)", (3, 4), True),
+    ],
+)
+def test_SType_symbolic_check_ndarray(in1, in2, out1):
+    stype = SType(in1)
+    assert stype.check_ndarray(np.empty(in2)) == out1
+    assert stype.check_many([in2, (1,)]).tolist() == [out1, False]
+
+
+def test_SType_bind():
+    bindings = {}
+    assert SType("(N, 3)").bind(np.ones((5, 3)), bindings)
+    assert bindings == {"N": 5}
+    assert SType("(N,)").bind(np.ones(5), bindings)
+    assert not SType("(M, N)").bind(np.ones((2, 4)), bindings)
+    assert bindings == {"N": 5}
+    assert SType("(M, N)").bind(np.ones((2, 5)), bindings)
+    assert bindings == {"N": 5, "M": 2}
+
+
+def test_unify_shapes():
+    x = np.ones((4, 3))
+    assert unify_shapes([("(N, 3)", x), ("(N,)", np.ones(4))]) == {"N": 4}
+    with pytest.raises(ShapeError, match="Array 1"):
+        unify_shapes([("(N, 3)", x), ("(N,)", np.ones(5))])
+    with pytest.raises(ShapeError):
+        unify_shapes([("(N, 3)", x)], bindings={"N": 2})
+
+
+@pytest.mark.parametrize(
+    "in1, out1",
+    [
+        ("(1..64, 3)", (range(1, 65), 3)),
+        ("(2.., :)", (range(2, sys.maxsize), ":")),
+        ("(..8)", (range(0, 9),)),
+        ("(:, {3, 4})", (":", frozenset({3, 4}))),
+        ("{3, 4}", (3, 4)),
+        ("{3, 4}, 2", (frozenset({3, 4}), 2)),
+        ((range(1, 3), {1, 2}), (range(1, 3), frozenset({1, 2}))),
+        ("(..., 1..2)", (..., range(1, 3))),
+        ("(5..2)", None),
+        ("(1..2..3)", None),
+        ("({})", None),
+        ("({1, :})", None),
+        ((range(0, 10, 2),), None),
+        (({1, -1},), None),
+        (({1, "N"},), None),
+    ],
+)
+def test_SType_range_and_enumeration_parse(in1, out1):
+    if out1 is None:
+        assert not isinstance(in1, STypeLike)
+    else:
+        assert SType(in1) == out1
+
+
+@pytest.mark.parametrize(
+    "in1, in2, out1",
+    [
+        ("(1..4, 3)", (1, 3), True),
+        ("(1..4, 3)", (4, 3), True),
+        ("(1..4, 3)", (0, 3), False),
+        ("(1..4, 3)", (5, 3), False),
+        ("(2.., :)", (100, 1), True),
+        ("(2.., :)", (1, 1), False),
+        ("(:, {3, 4})", (7, 4), True),
+        ("(:, {3, 4})", (7, 5), False),
+        ("(..., {1, 2}, 1..2)", (9, 2, 2), True),
+        ("(..., {1, 2}, 1..2)", (9, 2, 3), False),
+    ],
+)
+def test_SType_range_and_enumeration_check(in1, in2, out1):
+    stype = SType(in1)
+    assert stype.check_ndarray(np.empty(in2)) == out1
+    assert stype.check_many([in2]).tolist() == [out1]
+
+
+# array-like objects are checked without converting them to numpy arrays
+array_like_test_list = [
+    ([[1, 2], [3, 4]], (2, 2)),
+    ([[], []], (2, 0)),
+    ([], (0,)),
+    (((1, 2, 3),), (1, 3)),
+    ([np.zeros(3), np.zeros(3)], (2, 3)),
+    (memoryview(np.zeros((2, 3))), (2, 3)),
+    (array.array("d", [1.0, 2.0]), (2,)),
+    (bytearray(b"abc"), (3,)),
+    (b"abc", ()),
+    ("abc", ()),
+    (np.float32(1.0), ()),
+    (7, ()),
+]
+
+
+@pytest.mark.parametrize("in1, out1", array_like_test_list)
+def test_SType_check_ndarray_array_like_shape(in1, out1):
+    assert np.array(in1).shape == out1
+    assert SType(out1).check_ndarray(in1)
+    assert not SType((*out1, 1)).check_ndarray(in1)
+    assert SType(out1).bind(in1, {})
+
+
+@pytest.mark.parametrize("in1", [[[1, 2], [3]], [[1, 2], 3], [np.zeros(3), np.zeros(2)]])
+def test_SType_check_ndarray_inhomogeneous_nesting(in1):
+    assert not SType("(2, :)").check_ndarray(in1)
+    assert not SType("(2, :)").bind(in1, {})
+    assert SType("(2, :)").check_many([in1, (2, 3)]).tolist() == [False, True]
+
+
+def test_SType_check_ndarray_stops_at_first_element():
+    class Element(list):
+        def __len__(self):
+            raise AssertionError("not visited")
+
+    nested = [[1, 2, 3], Element()]
+    assert not SType("(2, 2)").check_ndarray(nested)
+
+
+class _ArrayAPIObject:
+    """Foreign array which must not be converted by numpy."""
+
+    def __init__(self, shape):
+        self.shape = shape
+
+    def __array_namespace__(self, api_version=None):
+        return np
+
+    def __array__(self, dtype=None, copy=None):
+        raise AssertionError("converted")
+
+
+@pytest.mark.parametrize(
+    "in1, in2, out1",
+    [
+        ("(:, 3)", (5, 3), True),
+        ("(:, 3)", (5, 4), False),
+        ("(..., 2..4)", (1, 2, 3), True),
+        ("(:, 3)", (None, 3), True),
+        ("(N, 3)", (None, 3), True),
+        ("(2, 3)", (None, 3), False),
+    ],
+)
+def test_SType_check_ndarray_array_api_object(in1, in2, out1):
+    assert SType(in1).check_ndarray(_ArrayAPIObject(in2)) == out1
+
+
+def test_SType_check_ndarray_memmap_and_masked(tmp_path):
+    memmap = np.lib.format.open_memmap(tmp_path / "a.npy", mode="w+", dtype=np.float32, shape=(1000, 3))
+    assert SType("(:, 3)").check_ndarray(memmap)
+    assert not SType("(:, 4)").check_ndarray(memmap)
+    assert SType("(2, :)").check_ndarray(np.ma.masked_array([[1, 2], [3, 4]], mask=[[0, 1], [0, 0]]))
+
+
+@pytest.mark.parametrize(
+    "in1, out1",
+    [
+        ("float32[:, 3]", (np.dtype(np.float32), (":", 3))),
+        (" floating [..., 3] ", (np.floating, (..., 3))),
+        ("datetime64[s][:]", (np.dtype("datetime64[s]"), (":",))),
+        ("f8[N, {2, 3}]", (np.dtype(np.float64), ("N", frozenset({2, 3})))),
+        ((np.int16, (":", 3)), (np.dtype(np.int16), (":", 3))),
+        ((np.integer, "(2, 1..4)"), (np.integer, (2, range(1, 5)))),
+        ((None, [3]), (None, (3,))),
+    ],
+)
+def test_DSType_parse(in1, out1):
+    dstype = DSType(in1)
+    assert (dstype.dtype, tuple(dstype)) == out1
+    assert DSType(dstype) is dstype
+    assert isinstance(dstype, SType)
+    assert pickle.loads(pickle.dumps(dstype)) == dstype
+
+
+@pytest.mark.parametrize("in1", ["float33[:, 3]", "[:, 3]", "float32(:, 3)", "float32[3, ..., 3]", (np.float32,), 3])
+def test_DSType_parse_invalid(in1):
+    with pytest.raises(ValueError):
+        DSType(in1)
+
+
+@pytest.mark.parametrize(
+    "in1, in2, out1",
+    [
+        ("float32[:, 3]", np.ones((2, 3), np.float32), True),
+        ("float32[:, 3]", np.ones((2, 3), np.dtype(">f4")), True),
+        ("float32[:, 3]", np.ones((2, 3)), False),
+        ("float32[:, 3]", np.ones((2, 4), np.float32), False),
+        ("floating[..., 3]", np.ones((5, 2, 3)), True),
+        ("floating[..., 3]", np.ones((5, 2, 3), int), False),
+        ("number[:]", [1, 2.5], True),
+        ("integer[:]", [1, 2.5], False),
+        ((None, "(:, 3)"), np.ones((1, 3), bool), True),
+    ],
+)
+def test_DSType_check_ndarray(in1, in2, out1):
+    dstype = DSType(in1)
+    assert dstype.check_ndarray(in2) == out1
+    assert dstype.bind(in2, {}) == out1
+    assert dstype.check_many([in2]).tolist() == [out1]
+
+
+def test_DSType_equality():
+    assert DSType("float32[:, 3]") == DSType((np.float32, (":", 3)))
+    assert DSType("float32[:, 3]") != DSType("float64[:, 3]")
+    assert DSType("float32[:, 3]") != SType("(:, 3)")
+    assert SType("(:, 3)") != DSType("float32[:, 3]")
+    assert len({DSType("float32[:, 3]"), DSType("float32[:, 3]"), SType("(:, 3)")}) == 2
+    assert str(DSType("floating[N]")) == "DSType(floating, ('N',))"
+
+
+def test_DSType_check_many_first_failure():
+    dstype = DSType("float32[:, 3]")
+    arrays = [np.ones((2, 3), np.float32), (7, 3), np.ones((2, 3))]
+    mask, first = dstype.check_many(arrays, return_first_failure=True)
+    assert mask.tolist() == [True, True, False]
+    assert first == 2
+
+
 #
 # Ending: SType
 #
@@ -432,7 +879,1070 @@ def test_sndarray_stype_check_type(in1, in2, out1):
     assert a.check_stype() == out1
 
 
+# we check that the stype is kept by numpy operations
+
+def test_sndarray_keeps_stype_on_operations():
+    a = sndarray(a=np.ones((4, 3)), stype=(":", 3))
+    for result in (a + 1, a * a, np.sqrt(a), a.copy(), a[1:], np.concatenate([a, a])):
+        assert isinstance(result, sndarray)
+        assert result.stype == SType((":", 3))
+
+
+def test_sndarray_full_reduction_returns_scalar():
+    a = sndarray(a=np.ones((4, 3)), stype=(":", 3), auto_shape_check=True)
+    assert not isinstance(a.sum(), np.ndarray)
+    assert a.sum() == 12
+
+
+def test_sndarray_in_place_operation_keeps_identity():
+    a = sndarray(a=np.ones((4, 3)), stype=(":", 3), auto_shape_check=True)
+    b = a
+    a += 1
+    assert a is b
+    assert a.stype == SType((":", 3))
+
+
+def test_sndarray_attribute_lookup_is_not_wrapped():
+    a = sndarray(a=np.ones((4, 3)), stype=(":", 3))
+    assert "__getattribute__" not in vars(sndarray)
+    assert a.copy() is not a
+
+
+@pytest.mark.parametrize(
+    "operation",
+    [
+        lambda a: a.reshape(3, 4),
+        lambda a: a.ravel(),
+        lambda a: a.T,
+        lambda a: a.sum(axis=0),
+        lambda a: np.reshape(a, (12,)),
+        lambda a: np.concatenate([a, a], axis=1),
+    ],
+)
+def test_sndarray_auto_shape_check_raises(operation):
+    a = sndarray(a=np.ones((4, 3)), stype=(":", 3), auto_shape_check=True)
+    with pytest.raises(ShapeError):
+        operation(a)
+
+
+@pytest.mark.parametrize(
+    "operation",
+    [
+        lambda a: a.reshape(3, 4),
+        lambda a: a.sum(axis=0),
+        lambda a: np.concatenate([a, a], axis=1),
+    ],
+)
+def test_sndarray_without_auto_shape_check_does_not_raise(operation):
+    a = sndarray(a=np.ones((4, 3)), stype=(":", 3))
+    assert isinstance(operation(a), sndarray)
+
+
+# without auto shape check, the stype follows the shape changing methods
+
+@pytest.mark.parametrize(
+    ("operation", "expected"),
+    [
+        (lambda a: a.sum(axis=0), (3,)),
+        (lambda a: a.sum(axis=-1, keepdims=True), (":", 1)),
+        (lambda a: a.max(axis=(0, 1), keepdims=True), (1, 1)),
+        (lambda a: a.mean(axis=1), (":",)),
+        (lambda a: np.add.reduce(a), (3,)),
+        (lambda a: a.argmax(axis=0), (3,)),
+        (lambda a: a.T, (3, ":")),
+        (lambda a: a.transpose(1, 0), (3, ":")),
+        (lambda a: np.moveaxis(a, 0, -1), (3, ":")),
+        (lambda a: a.swapaxes(0, 1), (3, ":")),
+        (lambda a: a.reshape(2, 2, 3), (2, 2, 3)),
+        (lambda a: a.reshape(-1, 3), (":", 3)),
+        (lambda a: a.ravel(), (12,)),
+        (lambda a: np.expand_dims(a, 0), (1, ":", 3)),
+        (lambda a: np.expand_dims(a, 1), (":", 1, 3)),
+        (lambda a: np.expand_dims(a, 1).squeeze(), (":", 3)),
+    ],
+)
+def test_sndarray_stype_propagation(operation, expected):
+    a = sndarray(a=np.ones((4, 3)), stype=(":", 3))
+    result = operation(a)
+    assert result.stype == SType(expected)
+    assert result.check_stype()
+
+
+def test_sndarray_stype_propagation_keeps_elements():
+    a = sndarray(np.ones((2, 5, 5)), stype="float64[..., N, N]")
+    assert a.T.stype == DSType("float64[N, N, :]")
+    assert a.sum(axis=0).stype == DSType("float64[N, N]")
+    # other dtype: the shape part only
+    assert a.argmax(axis=-1).stype == SType((":", "N"))
+    b = sndarray(np.ones((4, 3, 1)), stype=(range(1, 9), {3, 4}, ":"))
+    assert b.squeeze().stype == SType((range(1, 9), {3, 4}))
+    assert b.transpose(2, 0, 1).stype == SType((":", range(1, 9), {3, 4}))
+
+
+def test_sndarray_stype_of_other_shape_changes():
+    a = sndarray(np.ones((3, 4, 5)), stype=("N", range(1, 9), 5))
+    # no rule: the stype is unknown, unless it still matches the new shape
+    for result in (a.cumsum(), np.multiply.outer(a, a), a.diagonal(), np.linalg.norm(a, axis=0), np.stack([a, a])):
+        assert result.stype is None
+    assert np.concatenate([a, a]).stype == a.stype
+    b = sndarray(np.ones((3, 4, 5)), stype=("N", range(1, 9), 5), auto_shape_check=True)
+    assert np.concatenate([b, b]).stype == b.stype
+
+
+def test_sndarray_stype_of_other_dtype():
+    a = sndarray(np.ones((4, 3)), stype="float64[:, 3]")
+    # a DSType keeps its shape part only, if the dtype changes
+    for result in (a.astype(np.int32), a > 0, np.isnan(a), a.view(np.int64)):
+        assert result.stype == SType((":", 3))
+        assert result.check_stype()
+    assert a.view(np.int8).stype is None
+    assert a.view(sndarray).stype == a.stype
+    assert (a + 1).stype == a.stype
+    b = sndarray(np.ones((4, 3)), stype="floating[:, 3]")
+    assert b.astype(np.float32).stype == b.stype
+
+
+def test_sndarray_stype_propagation_of_invalid_array():
+    a = sndarray(np.ones((4, 4)), stype=(":", 3))
+    assert a.T.stype is None
+    assert a.copy().stype == SType((":", 3))
+
+
+@pytest.mark.parametrize(
+    ("key", "expected"),
+    [
+        (slice(1, None), (":", 3)),
+        (0, (3,)),
+        ((slice(None), 0), (":",)),
+        ((slice(None), slice(None, 2)), (":", 2)),
+        ((slice(None), slice(None, None, -1)), (":", 3)),
+        (None, (1, ":", 3)),
+        ((..., None), (":", 3, 1)),
+        ((..., 1), (":",)),
+        ((1, ...), (3,)),
+        ((), (":", 3)),
+        ([0, 2], (":", 3)),
+        ((slice(None), [0, 1]), (":", 2)),
+        (np.array([True, False, True, True]), (":", 3)),
+        ((np.array([0, 1]), slice(None, 2)), (":", 2)),
+    ],
+)
+def test_sndarray_stype_of_index_expression(key, expected):
+    a = sndarray(a=np.ones((4, 3)), stype=(":", 3))
+    result = a[key]
+    assert result.stype == SType(expected)
+    assert result.check_stype()
+
+
+def test_sndarray_stype_of_index_expression_keeps_elements():
+    a = sndarray(np.ones((2, 5, 5)), stype="float64[..., N, N]")
+    assert a[1:].stype is a.stype
+    assert a[0].stype == DSType("float64[N, N]")
+    assert a[:, 1:].stype == DSType("float64[:, 4, N]")
+    b = sndarray(np.ones((4, 3)), stype=(range(1, 9), {3, 4}))
+    assert b[1:].stype == SType((3, {3, 4}))
+    assert b[::2, None].stype == SType((2, 1, {3, 4}))
+    assert [row.stype for row in b] == [SType(({3, 4},))] * 4
+
+
+def test_sndarray_stype_of_index_expression_not_cached_by_parse_cache():
+    a = sndarray(np.ones((50, 3)), stype=("N", 3))
+    SType.cache_clear()
+    stypes = [a[:k].stype for k in range(1, 50)] + [a[k].stype for k in range(50)]
+    assert SType.cache_info().currsize == 0
+    assert stypes[:49] == [SType((k, 3)) for k in range(1, 50)]
+    assert stypes[49:] == [SType((3,))] * 50
+
+
+def test_sndarray_stype_of_index_expression_fallback():
+    a = sndarray(np.ones((4, 3)), stype=(":", 3))
+    # several or multidimensional index arrays: the stype is unknown
+    assert a[[0, 1], [0, 1]].stype is None
+    assert a[[[0], [1]]].stype is None
+    assert a[np.ones((4, 3), dtype=bool)].stype is None
+    assert a[1, 2] == 1.0
+    # an integer separated from the index array: numpy moves the indexed axes to the front
+    c = sndarray(np.ones((3, 4, 5)), stype=True)
+    assert c[0, :, [1, 2]].shape == (2, 4)
+    assert c[0, :, [1, 2]].stype is None
+    assert c[0, [1, 2]].stype == SType((2, 5))
+    records = sndarray(np.zeros(4, dtype=[("x", float), ("y", float)]), stype=(":",))
+    assert records["x"].stype is None
+    # with auto shape check, the stype is a constraint and it is kept
+    b = sndarray(np.ones((4, 3)), stype=(":", 3), auto_shape_check=True)
+    assert b[0].stype == b.stype
+
+
+def test_sndarray_auto_shape_check_keeps_stype():
+    a = sndarray(np.ones((5, 5)), stype="(N, N)", auto_shape_check=True)
+    assert a.T.stype == a.stype
+    with pytest.raises(ShapeError):
+        a.sum(axis=0)
+
+
+def test_sndarray_auto_shape_check_valid_shape_change():
+    a = sndarray(a=np.ones((4, 3)), stype=(..., 3), auto_shape_check=True)
+    assert a.reshape(2, 2, 3).shape == (2, 2, 3)
+    assert a.sum(axis=0).shape == (3,)
+    assert np.concatenate([a, a]).shape == (8, 3)
+
+
+def test_sndarray_ufunc_preflight_before_allocation():
+    # the broadcast result would need 80 TB: it has to fail before allocation
+    a = sndarray(np.broadcast_to(np.zeros((1, 1)), (10**6, 1)), stype=(":", 1), auto_shape_check=True)
+    b = np.broadcast_to(np.zeros((1, 1)), (1, 10**7))
+    with pytest.raises(ShapeError, match="Broadcast shape"):
+        a + b  # noqa: B018
+    with pytest.raises(ShapeError, match="Broadcast shape"):
+        np.multiply(b, a)
+
+
+def test_sndarray_ufunc_results():
+    a = sndarray(np.ones((4, 3)), stype=(":", 3), auto_shape_check=True)
+    assert (a + a[:1]).stype == a.stype
+    assert isinstance(a > 0, sndarray)
+    quotient, remainder = divmod(a, 2)
+    assert quotient.stype == remainder.stype == a.stype
+    assert isinstance(a.sum(), float | np.floating)
+    assert np.add.at(a, [0], 1) is None
+    assert a[0, 0] == 2.0
+    with pytest.raises(ValueError):
+        a + np.ones(4)  # noqa: B018
+    # gufuncs are checked after the call
+    with pytest.raises(ShapeError):
+        a @ np.ones((3, 4))  # noqa: B018
+
+
+def test_sndarray_ufunc_out_keeps_identity():
+    a = sndarray(np.ones((4, 3)), stype=(":", 3), auto_shape_check=True)
+    b = a
+    b += 1
+    assert b is a and np.all(a == 2.0)
+    out = sndarray(np.empty((4, 3)), stype=(":", 3))
+    assert np.multiply(a, 2, out=out) is out
+    plain = np.empty((4, 3))
+    assert np.multiply(a, 2, out=plain) is plain
+
+
+def test_sndarray_out_argument_keeps_its_stype():
+    a = sndarray(np.ones((4, 3)), stype=(":", 3), auto_shape_check=True)
+    out = sndarray(np.empty(3), stype=(3,), auto_shape_check=True)
+    assert a.sum(axis=0, out=out) is out
+    assert np.sum(a, axis=0, out=out) is out
+    assert out.stype == SType((3,))
+    index = np.empty(3, dtype=np.intp)
+    assert a.argmax(axis=0, out=index) is index
+    assert a.argmax(0, index) is index
+    assert a.astype(np.float64, copy=False) is a
+
+
+def test_sndarray_resize():
+    a = sndarray(np.arange(6.0), stype=(":",)).copy()
+    a.resize(8)
+    assert a.shape == (8,) and a.stype == SType((8,))
+    a.resize((2, 4))
+    assert a.stype == SType((2, 4))
+    resize = a.resize
+    resize(3)
+    assert a.shape == (3,) and a.stype == SType((3,))
+    b = a
+    with pytest.raises(ValueError, match="refcheck"):
+        a.resize(5)
+    del b
+    b = a[:2]
+    with pytest.raises(ValueError, match="refcheck"):
+        a.resize(5)
+    del b
+    a.resize(5, refcheck=False)
+    assert a.shape == (5,) and a.stype == SType((5,))
+    with pytest.raises(ValueError, match="does not own its data"):
+        sndarray(np.zeros(4)).resize(2)
+
+
+def test_sndarray_resize_auto_shape_check():
+    a = sndarray(np.zeros((4, 3)), stype=(":", 3), auto_shape_check=True).copy()
+    a.resize(5, 3)
+    assert a.shape == (5, 3)
+    with pytest.raises(ShapeError):
+        a.resize(5, 4)
+    assert a.shape == (5, 3)
+    with deferred_shape_checks(raise_error=False) as violations:
+        a.resize((2, 2))
+    assert violations == [ShapeViolation((2, 2), SType((":", 3)))]
+
+
+def test_sndarray_ufunc_preflight_sampled_once():
+    policy = SamplingPolicy(every=2)
+    a = sndarray(np.ones((4, 3)), stype=(":", 3), auto_shape_check=True, auto_check_policy=policy)
+    with pytest.raises(ShapeError):
+        a[:, :1] + np.ones((1, 4))  # noqa: B018
+    assert (a[:, :1] + np.ones((1, 4))).shape == (4, 4)
+    assert policy.counts() == {SType((":", 3)): (2, 1)}
+    with deferred_shape_checks(raise_error=False) as violations:
+        c = a[:, :1] + np.ones((1, 4))
+    assert violations == [ShapeViolation((4, 4), SType((":", 3)))]
+    assert c.shape == (4, 4)
+
+
+def test_sndarray_auto_check_before_conversion():
+    with pytest.raises(ShapeError):
+        sndarray(_ArrayAPIObject((5, 4)), stype=(":", 3), auto_shape_check=True)
+    with pytest.raises(ShapeError):
+        sndarray([[1, 2]], stype=(":", 3), auto_shape_check=True)
+    a = sndarray([[1, 2, 3]], stype=(":", 3), auto_shape_check=True)
+    assert a.stype == SType((":", 3))
+    # without auto check, the stype is only attached
+    assert sndarray([[1, 2]], stype=(":", 3)).check_stype() is False
+
+
+def test_SamplingPolicy_every_and_budget():
+    policy = SamplingPolicy(every=3, budget=2)
+    stype = SType("(:, 3)")
+    assert [policy.sample(stype) for _ in range(9)] == [True, False, False, True] + [False] * 5
+    assert policy.counts() == {stype: (9, 2)}
+    policy.reset()
+    assert policy.sample(stype)
+
+
+def test_SamplingPolicy_rate():
+    policy = SamplingPolicy(rate=0.25, seed=1)
+    stype = SType("(:, 3)")
+    checks = sum(policy.sample(stype) for _ in range(4000))
+    assert 800 < checks < 1200
+    assert not any(SamplingPolicy(rate=0.0).sample(stype) for _ in range(100))
+
+
+def test_SamplingPolicy_call_site():
+    policy = SamplingPolicy(budget=1, key="call_site")
+    stype = SType("(:, 3)")
+    assert [policy.sample(stype) for _ in range(3)] == [True, False, False]
+    assert policy.sample(stype)
+    assert all(file == __file__ for file, _ in policy.counts())
+
+
+@pytest.mark.parametrize(
+    "kwargs",
+    [{"every": 0}, {"rate": 1.5}, {"budget": -1}, {"key": "array"}],
+)
+def test_SamplingPolicy_invalid(kwargs):
+    with pytest.raises(ValueError):
+        SamplingPolicy(**kwargs)
+
+
+def test_sndarray_auto_check_policy_per_array():
+    a = sndarray(np.ones((4, 3)), stype=(":", 3), auto_shape_check=True, auto_check_policy=SamplingPolicy(every=2))
+    with pytest.raises(ShapeError):
+        a.reshape(3, 4)
+    # second operation is not sampled
+    assert a.reshape(3, 4).shape == (3, 4)
+    # the policy is shared by derived arrays
+    assert a[1:].auto_check_policy is a.auto_check_policy
+
+
+def test_sndarray_auto_check_policy_global(monkeypatch):
+    monkeypatch.setattr(npstyping, "AUTO_CHECK_POLICY", SamplingPolicy(budget=0))
+    a = sndarray(np.ones((4, 3)), stype=(":", 3), auto_shape_check=True)
+    assert a.reshape(3, 4).shape == (3, 4)
+    a.auto_check_policy = SamplingPolicy()
+    with pytest.raises(ShapeError):
+        a.reshape(3, 4)
+
+
+def test_deferred_shape_checks_reports_alive_arrays():
+    a = sndarray(np.ones((4, 3)), stype=(":", 3), auto_shape_check=True)
+    with pytest.raises(ShapeError) as excinfo, deferred_shape_checks():
+        b = a.reshape(3, 4)
+        c = np.concatenate([a, a], axis=1)
+        a.reshape(2, 6)  # temporary, not alive at the end of the scope
+        d = np.concatenate([a, a])
+    assert excinfo.value.violations == [
+        ShapeViolation((3, 4), SType((":", 3))),
+        ShapeViolation((4, 6), SType((":", 3))),
+    ]
+    assert "2 array(s)" in str(excinfo.value)
+    assert b.shape == (3, 4) and c.shape == (4, 6) and d.shape == (8, 3)
+
+
+def test_deferred_shape_checks_without_raising():
+    a = sndarray(np.ones((4, 3)), stype=(":", 3), auto_shape_check=True)
+    with deferred_shape_checks(raise_error=False) as violations:
+        b = a.reshape(3, 4)
+        assert violations == []
+    assert violations == [ShapeViolation(b.shape, b.stype)]
+    # outside of the scope, the checks are immediate again
+    with pytest.raises(ShapeError):
+        a.reshape(3, 4)
+
+
+def test_deferred_shape_checks_fixed_before_exit():
+    a = sndarray(np.ones((4, 3)), stype=(":", 3), auto_shape_check=True)
+    with deferred_shape_checks() as violations:
+        b = a.reshape(3, 4)
+        b.stype = (3, 4)
+    assert violations == []
+
+
+def test_deferred_shape_checks_skipped_on_exception():
+    a = sndarray(np.ones((4, 3)), stype=(":", 3), auto_shape_check=True)
+    with pytest.raises(KeyError), deferred_shape_checks():
+        b = a.reshape(3, 4)  # noqa: F841
+        raise KeyError
+
+
+def test_sndarray_dstype():
+    a = sndarray(np.ones((4, 3), np.float32), stype="float32[:, 3]", auto_shape_check=True)
+    assert a.stype == DSType("float32[:, 3]")
+    assert a.check_stype()
+    assert (a * 2).stype == a.stype
+    with pytest.raises(ShapeError, match="dtype float64"):
+        a.astype(np.float64)
+    with pytest.raises(ShapeError):
+        np.add(a, 1.0, dtype=np.float64)
+    assert not a.check_stype((np.int32, (":", 3)))
+    with pytest.raises(ShapeError, match="dtype float64"):
+        sndarray(np.ones((4, 3)), stype="float32[:, 3]", auto_shape_check=True)
+    # the dtype is checked after the conversion by 'dtype'
+    b = sndarray([1, 2, 3], dtype=np.float32, stype="float32[:]", auto_shape_check=True)
+    assert b.dtype == np.float32
+    c = sndarray(np.zeros(3), dtype=np.int64, stype="int64[:]", auto_shape_check=True)
+    assert c.dtype == np.int64
+    with pytest.raises(ShapeError, match="shape"):
+        sndarray(np.zeros(4), dtype=np.int64, stype="int64[3]", auto_shape_check=True)
+    with pytest.raises(ValueError, match="Not a valid shape."):
+        sndarray(np.ones((4, 3)), stype="(:, 3, 3..1)")
+    with pytest.raises(ValueError, match="Not a valid dtype and shape."):
+        sndarray(np.ones((4, 3)), stype="float33[:, 3]")
+
+
+@pytest.mark.parametrize("in1", [(1, 0), (2, 0), (3, 0)])
+def test_read_npy_header(tmp_path, in1):
+    path = tmp_path / "a.npy"
+    with path.open("wb") as file:
+        np.lib.format.write_array(file, np.ones((4, 3), np.float32), version=in1)
+    assert read_npy_header(path) == ((4, 3), np.dtype(np.float32))
+
+
+def test_read_npy_header_utf8(tmp_path):
+    path = tmp_path / "a.npy"
+    dtype = np.dtype([("\u20ac", np.float32)])
+    with path.open("wb") as file, pytest.warns(UserWarning, match="3.0"):
+        np.lib.format.write_array(file, np.zeros(2, dtype))
+    assert read_npy_header(path) == ((2,), dtype)
+
+
+def test_read_npy_header_unknown_version(tmp_path):
+    path = tmp_path / "a.npy"
+    path.write_bytes(np.lib.format.magic(4, 0) + b"\x00" * 12)
+    with pytest.raises(ValueError, match="version 4.0"):
+        read_npy_header(path)
+
+
+def test_load_npy(tmp_path):
+    path = tmp_path / "a.npy"
+    np.save(path, np.arange(12, dtype=np.float32).reshape(4, 3))
+    a = load_npy(path, "float32[:, 3]", auto_shape_check=True)
+    assert isinstance(a, sndarray)
+    assert isinstance(a.base, np.memmap)
+    assert a.stype == DSType("float32[:, 3]")
+    assert a.auto_shape_check
+    assert a[1:].stype == a.stype
+    assert a[1:].tolist() == np.arange(3, 12).reshape(3, 3).tolist()
+    assert load_npy(str(path), (..., 3)).stype == SType((..., 3))
+
+
+@pytest.mark.parametrize("in1", ["(:, 4)", "float64[:, 3]", "integer[...]"])
+def test_load_npy_header_only(tmp_path, in1):
+    path = tmp_path / "a.npy"
+    with path.open("wb") as file:
+        # header of a large array without its data: mapping would fail
+        np.lib.format.write_array_header_1_0(file, {"descr": "<f4", "fortran_order": False, "shape": (10**6, 3)})
+    with pytest.raises(ShapeError, match="does not match"):
+        load_npy(path, in1)
+    with pytest.raises(ValueError):
+        load_npy(path, "(:, 3)")
+
+
+@pytest.mark.parametrize("in1", [2, 4, 5])
+def test_sndarray_pickle_keeps_constraint(in1):
+    a = sndarray(np.arange(12.0).reshape(4, 3), stype="float64[:, 3]", auto_shape_check=True)
+    b = pickle.loads(pickle.dumps(a, protocol=in1))
+    assert isinstance(b, sndarray)
+    assert b.stype == a.stype
+    assert b.auto_shape_check
+    assert np.array_equal(a, b)
+    with pytest.raises(ShapeError):
+        b.reshape(3, 4)
+    c = pickle.loads(pickle.dumps(a[::2, 1:], protocol=in1))
+    assert c.shape == (2, 2)
+    assert c.stype == a.stype
+
+
+def test_sndarray_pickle_out_of_band():
+    a = sndarray(np.ones((1000, 3)), stype=(":", 3))
+    buffers = []
+    data = pickle.dumps(a, protocol=5, buffer_callback=buffers.append)
+    assert len(buffers) == 1
+    assert len(data) < 1000
+    b = pickle.loads(data, buffers=buffers)
+    assert np.shares_memory(a, b)
+    assert b.stype == SType((":", 3))
+
+
+def test_sndarray_pickle_sampling_policy():
+    policy = SamplingPolicy(every=2, rate=0.5, budget=3, key="call_site", seed=1)
+    a = sndarray(np.zeros(3), stype=(":",), auto_shape_check=True, auto_check_policy=policy)
+    _ = a + 1
+    data = pickle.dumps(a)
+    assert len(data) < 1000
+    b = pickle.loads(data)
+    restored = b.auto_check_policy
+    assert restored is not policy
+    assert repr(restored) == repr(policy)
+    assert restored.counts() == {}
+    assert restored._random.getstate() == random.Random(1).getstate()  # noqa: SLF001
+
+
+def test_sndarray_without_finalize_has_defaults():
+    a = np.ndarray.__new__(sndarray, (2, 3))
+    assert a.stype is None
+    assert not a.auto_shape_check
+    assert (a + 1).shape == (2, 3)
+
+
+# SharedSndarray: arrays in shared memory, attached by name
+
+def _shared_sum(shared):
+    with shared:
+        array = shared.array
+        array[0, 0] = 100.0
+        result = (array.stype, array.shape, float(array.sum()))
+        del array
+    return result
+
+
+def test_SharedSndarray_from_array_and_attach():
+    shared = SharedSndarray.from_array(
+        sndarray(np.arange(12.0).reshape(4, 3), stype=(":", 3)), auto_shape_check=True,
+    )
+    try:
+        assert isinstance(shared.array, sndarray)
+        assert shared.array.stype == SType((":", 3))
+        with SharedSndarray.attach(shared.name) as other:
+            assert other.array.stype == shared.array.stype
+            assert other.array.auto_shape_check
+            assert np.array_equal(other.array, np.arange(12.0).reshape(4, 3))
+            other.array[0, 0] = -1.0
+            with pytest.raises(ShapeError):
+                other.array.reshape(3, 4)
+        assert shared.array[0, 0] == -1.0
+        shared.close()
+    finally:
+        shared.unlink()
+
+
+def test_SharedSndarray_pickles_the_name():
+    with SharedSndarray.from_array(np.arange(6.0).reshape(2, 3), "float64[:, 3]") as shared:
+        try:
+            data = pickle.dumps(shared)
+            assert b"float64" not in data and len(data) < 200
+            assert _shared_sum(pickle.loads(data)) == (DSType("float64[:, 3]"), (2, 3), 115.0)
+            assert shared.array[0, 0] == 100.0
+        finally:
+            shared.unlink()
+
+
+def test_SharedSndarray_create_checks_stype():
+    with pytest.raises(ShapeError):
+        SharedSndarray.create((2, 4), np.float64, (":", 3))
+    with pytest.raises(ShapeError):
+        SharedSndarray.create((2, 3), np.int32, "float64[:, 3]")
+    with pytest.raises(ValueError):
+        SharedSndarray.create((2, 3), object)
+    with SharedSndarray.create((0, 3), np.int16, (":", 3)) as shared:
+        shared.unlink()
+        assert shared.array.shape == (0, 3)
+
+
+def test_SharedSndarray_close_with_live_views():
+    shared = SharedSndarray.create((4, 3), np.float64)
+    try:
+        view = shared.array[1:]
+        with pytest.raises(BufferError):
+            shared.close()
+        assert shared.array[0].shape == (3,)
+        del view
+        shared.close()
+    finally:
+        shared.unlink()
+
+
+def test_SharedSndarray_attach_foreign_block():
+    from multiprocessing import shared_memory
+
+    block = shared_memory.SharedMemory(create=True, size=64)
+    try:
+        with pytest.raises(ValueError):
+            SharedSndarray.attach(block.name)
+    finally:
+        block.close()
+        block.unlink()
+
+
 #
 # Ending: sndarray
 #
 # ############################################
+
+
+# ############################################
+#
+# ElementType
+# -----------
+#
+
+
+def _object_array(values, shape=None):
+    array = np.empty(len(values), dtype=object)
+    array[:] = values
+    return array if shape is None else array.reshape(shape)
+
+
+_DATETIMES = [datetime.datetime(2020, 1, 1) + datetime.timedelta(hours=i) for i in range(12)]
+
+
+@pytest.mark.parametrize(
+    "in1, in2, out1",
+    [
+        ((datetime.datetime,), _object_array(_DATETIMES), True),
+        ((datetime.datetime,), _object_array(_DATETIMES, (3, 4)).T, True),
+        ((datetime.date,), _object_array(_DATETIMES), True),
+        ((datetime.datetime,), _object_array([*_DATETIMES, None]), False),
+        ((datetime.datetime, type(None)), _object_array([*_DATETIMES, None]), True),
+        ((datetime.datetime,), np.empty(0, dtype=object), True),
+        ((str,), [["a", "b"], ["c", "d"]], True),
+        ((np.floating,), np.ones(3, dtype=np.float32), True),
+        ((np.integer,), np.ones(3), False),
+    ],
+)
+def test_ElementType_check_ndarray(in1, in2, out1):
+    assert ElementType(*in1).check_ndarray(in2) == out1
+    assert ElementType(*in1, chunk_size=5).check_ndarray(in2) == out1
+
+
+def test_ElementType_stops_at_first_failing_chunk():
+    element_type = ElementType(datetime.datetime, chunk_size=4)
+    values = [*_DATETIMES[:4], 1, *_DATETIMES[:4], 1.5]
+    assert not element_type.check_ndarray(_object_array(values))
+    assert element_type._accepted == {datetime.datetime: True, int: False}
+
+
+def test_ElementType_sample():
+    values = _object_array(_DATETIMES * 100 + [None])
+    assert not ElementType(datetime.datetime).check_ndarray(values)
+    assert ElementType(datetime.datetime, sample=10, seed=0).check_ndarray(values[:-1])
+    # a small sample can miss the wrong element
+    samples = [ElementType(datetime.datetime, sample=10, seed=seed).check_ndarray(values) for seed in range(20)]
+    assert any(samples)
+
+
+@pytest.mark.parametrize(
+    "in1, in2",
+    [((), {}), ((1,), {}), ((int,), {"sample": 0}), ((int,), {"chunk_size": 0})],
+)
+def test_ElementType_invalid(in1, in2):
+    with pytest.raises((TypeError, ValueError)):
+        ElementType(*in1, **in2)
+
+
+def test_ElementType_equality():
+    assert ElementType(int, str) == ElementType(str, int)
+    assert ElementType(int) != ElementType(int, sample=3)
+    assert len({ElementType(int), ElementType(int)}) == 1
+    assert repr(ElementType(datetime.datetime, sample=3)) == "ElementType(datetime, sample=3)"
+
+
+#
+# Ending: ElementType
+#
+# ############################################
+
+
+# ############################################
+#
+# datetime64 / timedelta64 conversion
+# -----------------------------------
+#
+
+
+@pytest.mark.parametrize(
+    "in1, out1",
+    [
+        (np.array(["2020-01-02T03:04:05.123456789"], dtype="datetime64[ns]"), [datetime.datetime(2020, 1, 2, 3, 4, 5, 123456)]),
+        (np.array(["1969-12-31T23:59:59.9999999"], dtype="datetime64[ns]"), [datetime.datetime(1969, 12, 31, 23, 59, 59, 999999)]),
+        (np.array(["2020-05", "9999-12"], dtype="datetime64[M]"), [datetime.datetime(2020, 5, 1), datetime.datetime(9999, 12, 1)]),
+        (np.array([3, "NaT"], dtype="datetime64[2D]"), [datetime.datetime(1970, 1, 7), None]),
+        (np.array(["0001-01-01"], dtype="datetime64[s]"), [datetime.datetime(1, 1, 1)]),
+    ],
+)
+def test_datetime64_to_datetime(in1, out1):
+    result = datetime64_to_datetime(in1)
+    assert result.dtype == object
+    assert result.tolist() == out1
+
+
+@pytest.mark.parametrize(
+    "in1",
+    [
+        np.array([10**15], dtype="datetime64[D]"),
+        np.array(["10000-01"], dtype="datetime64[M]"),
+        np.array(["0000-12-31"], dtype="datetime64[D]"),
+    ],
+)
+def test_datetime64_to_datetime_out_of_range(in1):
+    with pytest.raises(ValueError):
+        datetime64_to_datetime(in1)
+
+
+def test_datetime64_to_datetime_wrong_dtype():
+    with pytest.raises(TypeError):
+        datetime64_to_datetime(np.arange(3))
+    with pytest.raises(TypeError):
+        timedelta64_to_timedelta(np.arange(3).astype("datetime64[s]"))
+
+
+@pytest.mark.parametrize(
+    "in1, out1",
+    [
+        (np.array([1500, -1, "NaT"], dtype="timedelta64[ns]"), [datetime.timedelta(microseconds=1), datetime.timedelta(microseconds=-1), None]),
+        (np.array([2], dtype="timedelta64[W]"), [datetime.timedelta(days=14)]),
+    ],
+)
+def test_timedelta64_to_timedelta(in1, out1):
+    assert timedelta64_to_timedelta(in1).tolist() == out1
+
+
+@pytest.mark.parametrize("in1", [np.array([1], dtype="timedelta64[M]"), np.array([10**15], dtype="timedelta64[D]")])
+def test_timedelta64_to_timedelta_invalid(in1):
+    with pytest.raises(ValueError):
+        timedelta64_to_timedelta(in1)
+
+
+@pytest.mark.parametrize("in1", ["Y", "M", "D", "s", "ms", "us", "ns"])
+def test_datetime_round_trip(in1):
+    array = (np.arange(12) * 100).astype(f"datetime64[{in1}]").reshape(3, 4)
+    objects = datetime64_to_datetime(array)
+    assert objects.shape == (3, 4)
+    if in1 != "ns":
+        assert np.array_equal(datetime_to_datetime64(objects, in1), array)
+
+
+@pytest.mark.parametrize("in1", ["W", "D", "s", "us", "ns"])
+def test_timedelta_round_trip(in1):
+    array = (np.arange(-6, 6) * 1000).astype(f"timedelta64[{in1}]").reshape(2, 6)
+    objects = timedelta64_to_timedelta(array)
+    assert objects.shape == (2, 6)
+    if in1 != "ns":
+        assert np.array_equal(timedelta_to_timedelta64(objects, in1), array)
+
+
+def test_datetime_to_datetime64_other_values():
+    result = datetime_to_datetime64([datetime.datetime(2020, 1, 1), None, datetime.date(2020, 1, 2)])
+    assert result.tolist() == [datetime.datetime(2020, 1, 1), None, datetime.datetime(2020, 1, 2)]
+    assert timedelta_to_timedelta64([datetime.timedelta(1), None]).tolist() == [datetime.timedelta(1), None]
+
+
+@pytest.mark.parametrize(
+    "in1",
+    [
+        lambda: datetime_to_datetime64([datetime.datetime(3000, 1, 1)], "ns"),
+        lambda: timedelta_to_timedelta64([datetime.timedelta(days=999_999_999)]),
+        lambda: timedelta_to_timedelta64([datetime.timedelta(days=1)], "M"),
+    ],
+)
+def test_to_datetime64_out_of_range(in1):
+    with pytest.raises(ValueError):
+        in1()
+
+
+def test_datetime_conversion_keeps_sndarray():
+    array = sndarray(np.arange(6).astype("datetime64[s]").reshape(3, 2), stype=(":", 2), auto_shape_check=True)
+    objects = datetime64_to_datetime(array)
+    assert isinstance(objects, sndarray)
+    assert objects.stype == SType((":", 2))
+    assert objects.auto_shape_check
+    back = datetime_to_datetime64(objects, "s")
+    assert isinstance(back, sndarray)
+    assert back.stype == SType((":", 2))
+    assert np.array_equal(back, array)
+
+
+#
+# Ending: datetime64 / timedelta64 conversion
+#
+# ############################################
+
+
+# ############################################
+#
+# check_shapes
+# ------------
+#
+
+
+@check_shapes(x="(:, 3)", y=(":",), returns=":")
+def _row_sums(x, y=None, *, scale=1):
+    return x.sum(axis=1) * scale
+
+
+@check_shapes
+def _annotated_row_sums(
+    x: Annotated[np.ndarray, SType("(:, 3)")],
+    *,
+    weights: Annotated[np.ndarray, SType("3")],
+) -> Annotated[np.ndarray, SType(":")]:
+    return x @ weights
+
+
+def test_check_shapes_decorator_arguments():
+    assert _row_sums(np.ones((4, 3))).shape == (4,)
+    assert _row_sums(x=np.ones((4, 3)), y=np.ones(4)).shape == (4,)
+    with pytest.raises(ShapeError, match="'x'"):
+        _row_sums(np.ones((4, 2)))
+    with pytest.raises(ShapeError, match="'y'"):
+        _row_sums(np.ones((4, 3)), np.ones((4, 1)))
+    assert _row_sums.__name__ == "_row_sums"
+
+
+def test_check_shapes_dstype():
+    @check_shapes(x="float32[N, 3]", returns="floating[N]")
+    def f(x):
+        return x.sum(axis=1)
+
+    assert f(np.ones((4, 3), np.float32)).shape == (4,)
+    with pytest.raises(ShapeError, match="'x'"):
+        f(np.ones((4, 3)))
+
+
+def test_check_shapes_annotations():
+    assert _annotated_row_sums(np.ones((4, 3)), weights=np.ones(3)).shape == (4,)
+    with pytest.raises(ShapeError, match="'weights'"):
+        _annotated_row_sums(np.ones((4, 3)), weights=np.ones(4))
+
+
+def test_check_shapes_return_value():
+    @check_shapes(returns="(:, 3)")
+    def f(x: Annotated[np.ndarray, SType(":")]) -> Annotated[np.ndarray, SType("3")]:
+        return x.reshape(-1, 1)
+
+    with pytest.raises(ShapeError, match="return value"):
+        f(np.ones(3))
+    with pytest.raises(ShapeError, match="'x'"):
+        f(np.ones((3, 1)))
+
+
+def test_check_shapes_async():
+    @check_shapes(x="3", returns="3")
+    async def f(x):
+        return x
+
+    assert asyncio.run(f(np.ones(3))).shape == (3,)
+    with pytest.raises(ShapeError):
+        asyncio.run(f(np.ones(4)))
+
+
+def test_check_shapes_symbolic_dimensions():
+    @check_shapes(x="(N, 3)", y="(N,)", returns="(N,)")
+    def f(x, y):
+        return x.sum(axis=1) + y
+
+    assert f(np.ones((4, 3)), np.ones(4)).shape == (4,)
+    with pytest.raises(ShapeError, match="'y'.*bindings"):
+        f(np.ones((4, 3)), np.ones(5))
+
+    @check_shapes(x="(N, 3)", returns="(N,)")
+    def g(x):
+        return x[1:, 0]
+
+    with pytest.raises(ShapeError, match="return value"):
+        g(np.ones((4, 3)))
+
+
+def test_check_shapes_unknown_parameter():
+    with pytest.raises(TypeError):
+
+        @check_shapes(z="3")
+        def f(x):
+            return x
+
+
+def test_check_shapes_returns_original_function_without_typecheck(monkeypatch):
+    monkeypatch.setattr(npstyping, "DO_TYPECHECK", False)
+
+    def f(x):
+        return x
+
+    assert check_shapes(x="3")(f) is f
+    assert check_shapes(f) is f
+
+
+#
+# Ending: check_shapes
+#
+# ############################################
+
+
+# ############################################
+#
+# StreamCheck
+# -----------
+#
+
+
+def _chunks(*rows, width=4):
+    for n in rows:
+        yield np.zeros((n, width))
+
+
+async def _achunks(*chunks):
+    for chunk in chunks:
+        await asyncio.sleep(0)
+        yield chunk
+
+
+def test_StreamCheck_passes_chunks():
+    chunks = list(_chunks(3, 0, 5))
+    checked = StreamCheck(iter(chunks), "(:, 4)", rows=8)
+    assert all(a is b for a, b in zip(checked, chunks))
+    assert (checked.count, checked.total, checked.trailing) == (3, 8, (4,))
+
+
+def test_StreamCheck_chunk_stype():
+    with pytest.raises(ShapeError, match="Chunk 1"):
+        list(StreamCheck([np.zeros((2, 4)), np.zeros((2, 3))], "(:, 4)"))
+    with pytest.raises(ShapeError):
+        list(StreamCheck([np.zeros((2, 4), dtype=np.int8)], "float64[:, 4]"))
+    assert len(list(StreamCheck([[[1, 2]], [[3, 4], [5, 6]]], "(:, 2)"))) == 2
+
+
+def test_StreamCheck_rows():
+    with pytest.raises(ShapeError, match="has 7 rows"):
+        list(StreamCheck(_chunks(3, 4), "(:, 4)", rows=8))
+    checked = StreamCheck(_chunks(3, 4, 5, 6), "(:, 4)", rows=8)
+    with pytest.raises(ShapeError, match="exceeds"):
+        for _ in checked:
+            pass
+    assert checked.count == 3
+    assert len(list(StreamCheck(_chunks(3, 4), "(:, 4)", rows=range(1, 10)))) == 2
+    assert list(StreamCheck([], "(:, 4)", rows=range(10))) == []
+
+
+def test_StreamCheck_consistent_trailing_dims():
+    chunks = [np.zeros((2, 3)), np.zeros((2, 4))]
+    with pytest.raises(ShapeError, match="trailing"):
+        list(StreamCheck(chunks, "(:, :)"))
+    assert len(list(StreamCheck(chunks, "(:, :)", consistent=False))) == 2
+
+
+def test_StreamCheck_binds_symbols_across_chunks():
+    checked = StreamCheck(_chunks(2, 2, 3, width=5), "(:, N)", consistent=False)
+    chunk_iter = iter(checked)
+    next(chunk_iter)
+    assert checked.bindings == {"N": 5}
+    with pytest.raises(ShapeError, match="bindings"):
+        list(StreamCheck([np.zeros((2, 2)), np.zeros((3, 3))], "(N, N)"))
+
+
+def test_StreamCheck_async():
+    async def collect(checked):
+        return [chunk async for chunk in checked]
+
+    checked = StreamCheck(_achunks(*_chunks(1, 2)), "(:, 4)", rows=3)
+    assert len(asyncio.run(collect(checked))) == 2
+    assert checked.total == 3
+    with pytest.raises(ShapeError):
+        asyncio.run(collect(StreamCheck(_achunks(np.zeros((1, 3))), "(:, 4)")))
+    with pytest.raises(ShapeError):
+        asyncio.run(collect(StreamCheck(_achunks(*_chunks(1)), "(:, 4)", rows=2)))
+
+
+#
+# Ending: StreamCheck
+#
+# ############################################
+
+
+# ############################################
+#
+# Instrumentation
+# ---------------
+#
+
+
+@pytest.fixture
+def instrumentation():
+    reset_instrumentation()
+    events = []
+    enable_instrumentation(lambda *event: events.append(event))
+    yield events
+    disable_instrumentation()
+    reset_instrumentation()
+
+
+def test_instrumentation_counts(instrumentation):
+    SType.cache_clear()
+    stype = SType("(:, 3, 7)")
+    SType("(:, 3, 7)")
+    assert stype.check_ndarray(np.empty((2, 3, 7)))
+    assert not stype.check_ndarray(np.empty((2, 3)))
+    snapshot = instrumentation_snapshot()
+    assert snapshot["enabled"]
+    assert snapshot["stype"]["calls"] == 2
+    assert snapshot["parse"]["calls"] == 1
+    assert snapshot["compile"]["calls"] == 1
+    assert snapshot["check"]["calls"] == 2
+    assert snapshot["check"]["failures"] == 1
+    assert snapshot["checks_per_stype"][stype]["calls"] == 2
+    assert snapshot["checks_per_stype"][stype]["ns"] > 0
+    assert [event[0] for event in instrumentation] == ["parse", "compile", "stype", "stype", "check", "check"]
+    assert instrumentation[-1][1:2] == (stype,) and instrumentation[-1][3] is False
+    dstype = DSType("float32[:, 3, 7]")
+    assert not dstype.check_ndarray(np.empty((2, 3, 7)))
+    assert not dstype.check_ndarray([[1, 2]])
+    checks = instrumentation_snapshot()["checks_per_stype"][dstype]
+    assert (checks["calls"], checks["failures"]) == (2, 2)
+
+
+def test_instrumentation_parse_failure(instrumentation):
+    with pytest.raises(ValueError):
+        SType("(3, ..., 3)")
+    assert instrumentation_snapshot()["parse"]["failures"] == 1
+
+
+def test_instrumentation_sndarray_hooks(instrumentation):
+    a = sndarray(np.ones((4, 3)), stype=(":", 3), auto_shape_check=True)
+    a + 1  # noqa: B018
+    np.concatenate([a, a])
+    with pytest.raises(ShapeError):
+        a.reshape(3, 4)
+    hook = instrumentation_snapshot()["hook"]
+    assert hook["calls"] == 3
+    assert hook["failures"] == 1
+
+
+def test_instrumentation_disabled_restores_methods():
+    check_ndarray = SType.__dict__["check_ndarray"]
+    enable_instrumentation()
+    assert SType.__dict__["check_ndarray"] is not check_ndarray
+    disable_instrumentation()
+    assert SType.__dict__["check_ndarray"] is check_ndarray
+    reset_instrumentation()
+    SType("(:, 3)").check_ndarray(np.empty((1, 3)))
+    snapshot = instrumentation_snapshot()
+    assert not snapshot["enabled"]
+    assert snapshot["check"]["calls"] == 0
+
+
+#
+# Ending: Instrumentation
+#
+# ############################################